@@ -20,27 +20,21 @@
 
 # %%
 import pandas as pd
-import pooch
 
-from utils import PROCESSED_DATA_DIR
+from ingestion import WESTERN_ARCHIVE, ingest_archive
 
-# %%
-raw_data_file = pooch.retrieve(
-    "https://zenodo.org/records/10782689/files/Projections.zip?download=1",
-    known_hash="10ffeebdcfd362186ce64abb1dc1710e3ebf4d6b41bf18faf2bb7ff45a82b2f7",
-    processor=pooch.Unzip(members=["Projections/hcfc_projections_v2.csv"]),
-)
-if len(raw_data_file) != 1:
-    raise AssertionError
-
-raw_data_file = raw_data_file[0]
-raw_data_file
+# %% [markdown]
+# The download is verified against its known hash
+# and only the files we need are unzipped.
+# If the unzipped files and the parser haven't changed
+# since the output was last written, parsing is skipped
+# (pass `force=True` to re-parse anyway).
+# To get all the reference archives at once (concurrently), use
+# `python compare_ghg.py ingest` instead.
 
 # %%
-raw = pd.read_csv(raw_data_file, skiprows=1)
-raw
+out_file = ingest_archive(WESTERN_ARCHIVE)
+out_file
 
 # %%
-out_file = PROCESSED_DATA_DIR / "western-et-al-2024" / "hcfc_projections.csv"
-out_file.parent.mkdir(exist_ok=True, parents=True)
-raw.to_csv(out_file, index=False)
+pd.read_csv(out_file)
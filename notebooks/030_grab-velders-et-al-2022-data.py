@@ -20,40 +20,49 @@
 
 # %%
 import pandas as pd
-import pooch
 
-from utils import PROCESSED_DATA_DIR
-
-# %%
-raw_data_file = pooch.retrieve(
-    "https://zenodo.org/records/6520707/files/veldersguus/HFC-scenarios-2022-v1.0.zip?download=1",
-    known_hash="74fe066fac06b742ba4fec6ad3af52a595f81a2a1c69d53a8eaf9ca846b3a7cd",
-    processor=pooch.Unzip(members=["veldersguus-HFC-scenarios-2022-859d44c/HFC_Current_Policy_2022_Scenario.xlsx"]),
+from ingestion import (
+    VELDERS_ARCHIVE,
+    VELDERS_SPECIES,
+    ingest_archive,
+    parse_velders_et_al_2022,
+    retrieve_archive,
 )
-if len(raw_data_file) != 1:
-    raise AssertionError
 
-raw_data_file = raw_data_file[0]
-raw_data_file
+# %% [markdown]
+# The download is verified against its known hash
+# and only the files we need are unzipped.
+# If the unzipped files and the parser haven't changed
+# since the output was last written, parsing is skipped
+# (pass `force=True` to re-parse anyway).
+# To get all the reference archives at once (concurrently), use
+# `python compare_ghg.py ingest` instead.
 
 # %%
-# Doesn't matter whether we use upper or lower as we're just getting historical data
-raw_excel = pd.read_excel(raw_data_file, sheet_name="Upper", header=None)
-raw_excel
+out_file = ingest_archive(VELDERS_ARCHIVE)
+out_file
 
 # %%
-expected_species = ['HFC-32', 'HFC-125', 'HFC-134a', 'HFC-143a', 'HFC-152a', 'HFC-227ea',
-       'HFC-236fa', 'HFC-245fa', 'HFC-365mfc', 'HFC-43-10mee']
+pd.read_csv(out_file)
+
+# %% [markdown]
+# ## Regression check
+#
+# The workbook used to be parsed with fixed offsets
+# (each species' block is 112 rows long, the first starts in row 4).
+# Check that splitting the sheet on its header rows gives the same output.
 
 # %%
+(raw_data_file,) = retrieve_archive(VELDERS_ARCHIVE)
+raw_excel = pd.read_excel(raw_data_file, sheet_name="Upper", header=None)
+
 start_idx = 4
 block_length = 112
-expected_n_blocks = 10
 
-clean_l = []
-for i in range(expected_n_blocks):
+fixed_offsets_l = []
+for i in range(len(VELDERS_SPECIES)):
     start = start_idx + i * (block_length + 1)
-    species_df = raw_excel.iloc[start:start + block_length]
+    species_df = raw_excel.iloc[start : start + block_length]
     species_df = species_df.dropna(how="all", axis="columns")
     species_df.columns = species_df.iloc[0, :]
     species_df = species_df.iloc[1:, :]
@@ -63,20 +72,16 @@ for i in range(expected_n_blocks):
         raise AssertionError
     gas = gas[0]
 
-    keep = species_df[["Year", "Mix_tot"]].rename({"Year": "year", "Mix_tot": gas}, axis="columns")
+    keep = species_df[["Year", "Mix_tot"]].rename(
+        {"Year": "year", "Mix_tot": gas}, axis="columns"
+    )
     keep = keep[keep["year"] < 2025]
     keep = keep.set_index("year")
-    # display(keep)
 
-    clean_l.append(keep)
+    fixed_offsets_l.append(keep)
 
-clean = pd.concat(clean_l, axis="columns")
-if set(clean.columns) != set(expected_species):
-    raise AssertionError
-    
-clean
+fixed_offsets = pd.concat(fixed_offsets_l, axis="columns").reset_index()
 
-# %%
-out_file = PROCESSED_DATA_DIR / "velders-et-al-2022" / "hfc_projections.csv"
-out_file.parent.mkdir(exist_ok=True, parents=True)
-clean.to_csv(out_file)
+pd.testing.assert_frame_equal(
+    parse_velders_et_al_2022([raw_data_file]), fixed_offsets, check_dtype=False
+)
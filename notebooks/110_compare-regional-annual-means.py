@@ -0,0 +1,148 @@
+# ---
+# jupyter:
+#   jupytext:
+#     text_representation:
+#       extension: .py
+#       format_name: percent
+#       format_version: '1.3'
+#       jupytext_version: 1.15.2
+#   kernelspec:
+#     display_name: Python 3 (ipykernel)
+#     language: python
+#     name: python3
+# ---
+
+# %% [markdown]
+# # Compare regional, annual-means
+#
+# Here we compare hemispheric- and latitudinal band-, annual-means
+# for different gases.
+# All data is aggregated onto a common set of regions
+# (see `spatial.py`), so sources on different grids can be compared.
+
+# %%
+from esgpull.cli.utils import init_esgpull
+
+from cache import AnnualMeanCache, load_annual_means
+from catalogue import SOURCE_ID_REGISTRY, FileCatalogue
+from differences import check_for_gaps, compute_differences
+from loading import normalise_variable_names
+from radiative_efficiencies import get_data_units, get_radiative_efficiencies
+from rendering import get_regional_difference_jobs, render_figures
+from spatial import (
+    REGIONAL_LOADER_VERSION,
+    REGIONS,
+    SPATIAL_FILE_PATTERNS,
+    load_regional_annual_mean,
+    select_grid_labels,
+)
+from utils import FIGURES_DIR, INTERIM_DATA_DIR
+
+# %% [markdown]
+# # Load CMIP data
+
+# %%
+esg = init_esgpull(verbosity=0, load_db=False)
+
+# %%
+data_path = esg.config.paths.data
+data_path
+
+# %%
+CMIP6_SOURCE_ID = "UoM-CMIP-1-2-0"
+CMIP7_COMPARE_SOURCE_ID = "CR-CMIP-0-4-0"
+
+source_id_registry = SOURCE_ID_REGISTRY
+REGIONS
+
+# %%
+files_to_parse = [
+    fp for pattern in SPATIAL_FILE_PATTERNS for fp in data_path.rglob(pattern)
+]
+
+file_catalogue = FileCatalogue(INTERIM_DATA_DIR / "file-catalogue.sqlite")
+db = file_catalogue.get_db(
+    files_to_parse, source_id_registry=source_id_registry, n_workers=1
+)
+db["variable_normalised"] = db["variable_id"].apply(normalise_variable_names)
+db
+
+# %%
+# Latitudinal bands are only published monthly,
+# so we use monthly data throughout.
+# Each (source ID, variable) combination is loaded from a single grid,
+# preferring latitudinal bands over hemispheric-means.
+to_load = select_grid_labels(
+    db[
+        (db["frequency"] == "mon")
+        & (db["source_id"].isin([CMIP6_SOURCE_ID, CMIP7_COMPARE_SOURCE_ID]))
+        & (db["variable_normalised"].isin(["co2", "ch4", "n2o"]))
+    ]
+)
+to_load.groupby(["source_id", "grid_label"])["variable_normalised"].unique()
+
+# %%
+# Files are read in chunks along time and aggregated to regions straight away,
+# so memory use stays bounded however finely resolved the files are.
+regional_cache = AnnualMeanCache(
+    INTERIM_DATA_DIR / "regional-annual-mean-cache",
+    file_catalogue=file_catalogue,
+    loader=load_regional_annual_mean,
+    loader_version=REGIONAL_LOADER_VERSION,
+)
+
+loaded, load_timings = load_annual_means(
+    to_load,
+    regional_cache,
+    store_dir=INTERIM_DATA_DIR / "regional-annual-mean-store",
+    n_workers=8,
+)
+loaded
+
+# %%
+load_timings.sort_values("time (s)", ascending=False)
+
+# %% [markdown]
+# ## Changes since CMIP6
+
+# %%
+gases = sorted(v for v in loaded.data_vars if "bnds" not in v)
+
+data_units = get_data_units(loaded, gases)
+radiative_efficiencies = get_radiative_efficiencies(
+    data_units,
+    cache_path=INTERIM_DATA_DIR / "radiative-efficiencies.json",
+)
+
+check_for_gaps(loaded, gases, years=range(1900, 2010 + 1))
+
+differences = compute_differences(
+    loaded,
+    compare_source_id=CMIP7_COMPARE_SOURCE_ID,
+    base_source_id=CMIP6_SOURCE_ID,
+    radiative_efficiencies=radiative_efficiencies,
+    radiative_efficiency_units=data_units,
+    gases=gases,
+)
+differences
+
+# %%
+# Regions which one of the sources doesn't resolve are all NaN
+erf_max = differences["erf_max"].to_dataframe()["erf_max"].unstack("region")
+erf_max
+
+# %%
+look_here = erf_max.stack()
+look_here = look_here[look_here > 0.01]  # "W / m^2"
+look_here
+
+# %%
+regional_jobs = get_regional_difference_jobs(
+    differences,
+    gases,
+    compare_source_id=CMIP7_COMPARE_SOURCE_ID,
+    base_source_id=CMIP6_SOURCE_ID,
+)
+
+rendered = render_figures(regional_jobs, FIGURES_DIR, n_workers=8)
+print(f"Rendered {len(rendered)} of {len(regional_jobs)} figures in {FIGURES_DIR}")
@@ -0,0 +1,138 @@
+# ---
+# jupyter:
+#   jupytext:
+#     text_representation:
+#       extension: .py
+#       format_name: percent
+#       format_version: '1.3'
+#       jupytext_version: 1.15.2
+#   kernelspec:
+#     display_name: Python 3 (ipykernel)
+#     language: python
+#     name: python3
+# ---
+
+# %% [markdown]
+# # Compare seasonal cycles
+#
+# Here we compare the seasonal cycles of the global-means for different gases,
+# using monthly data.
+# For each year, we calculate the amplitude and phase of the seasonal cycle
+# (see `seasonal.py`), then compare these between source IDs.
+
+# %%
+from pathlib import Path
+
+from esgpull.cli.utils import init_esgpull
+
+from cache import AnnualMeanCache, load_annual_means
+from catalogue import SOURCE_ID_REGISTRY, FileCatalogue
+from loading import normalise_variable_names
+from rendering import render_figures
+from seasonal import (
+    SEASONAL_LOADER_VERSION,
+    compute_seasonal_differences,
+    get_seasonal_cycle_jobs,
+    load_seasonal_cycle,
+)
+from utils import FIGURES_DIR, INTERIM_DATA_DIR
+
+# %% [markdown]
+# # Load CMIP data
+
+# %%
+esg = init_esgpull(verbosity=0, load_db=False)
+
+# %%
+data_path = esg.config.paths.data
+data_path
+
+# %%
+local_data_path = None
+local_data_path
+
+# %%
+CMIP6_SOURCE_ID = "UoM-CMIP-1-2-0"
+CMIP7_COMPARE_SOURCE_ID = "CR-CMIP-0-4-0"
+
+source_id_registry = SOURCE_ID_REGISTRY
+
+# %%
+files_to_parse = [*data_path.rglob("*gm*.nc"), *data_path.rglob("*gr1-GMNHSH*.nc")]
+if local_data_path is not None:
+    files_to_parse = [
+        *files_to_parse,
+        *Path(local_data_path).rglob("**/mon/**/*gm*.nc"),
+    ]
+
+file_catalogue = FileCatalogue(INTERIM_DATA_DIR / "file-catalogue.sqlite")
+db = file_catalogue.get_db(
+    files_to_parse, source_id_registry=source_id_registry, n_workers=1
+)
+db["variable_normalised"] = db["variable_id"].apply(normalise_variable_names)
+db
+
+# %%
+to_load = db[
+    (db["frequency"] == "mon")
+    & (db["source_id"].isin([CMIP6_SOURCE_ID, CMIP7_COMPARE_SOURCE_ID]))
+    & (db["variable_normalised"].isin(["co2", "ch4", "n2o"]))
+]
+to_load
+
+# %%
+# Each (source ID, variable) combination is loaded in its own task
+# (each task holds its whole, small, monthly global-mean record in memory)
+# and only its per-year diagnostics are kept.
+# Only combinations whose input files (or the loading code) have changed
+# are re-loaded.
+seasonal_cycle_cache = AnnualMeanCache(
+    INTERIM_DATA_DIR / "seasonal-cycle-cache",
+    file_catalogue=file_catalogue,
+    loader=load_seasonal_cycle,
+    loader_version=SEASONAL_LOADER_VERSION,
+)
+
+loaded, load_timings = load_annual_means(
+    to_load,
+    seasonal_cycle_cache,
+    store_dir=INTERIM_DATA_DIR / "seasonal-cycle-store",
+    n_workers=8,
+)
+loaded
+
+# %%
+load_timings.sort_values("time (s)", ascending=False)
+
+# %% [markdown]
+# ## Changes since CMIP6
+
+# %%
+gases = sorted(to_load["variable_normalised"].unique())
+
+seasonal_differences = compute_seasonal_differences(
+    loaded,
+    compare_source_id=CMIP7_COMPARE_SOURCE_ID,
+    base_source_id=CMIP6_SOURCE_ID,
+    gases=gases,
+)
+seasonal_differences
+
+# %%
+seasonal_differences[
+    ["amplitude_max", "amplitude_relative_max", "phase_max"]
+].to_dataframe()
+
+# %%
+seasonal_cycle_jobs = get_seasonal_cycle_jobs(
+    loaded,
+    seasonal_differences,
+    gases,
+    compare_source_id=CMIP7_COMPARE_SOURCE_ID,
+    base_source_id=CMIP6_SOURCE_ID,
+)
+
+rendered = render_figures(seasonal_cycle_jobs, FIGURES_DIR, n_workers=8)
+print(
+    f"Rendered {len(rendered)} of {len(seasonal_cycle_jobs)} figures in {FIGURES_DIR}"
+)
@@ -0,0 +1,113 @@
+# ---
+# jupyter:
+#   jupytext:
+#     text_representation:
+#       extension: .py
+#       format_name: percent
+#       format_version: '1.3'
+#       jupytext_version: 1.15.2
+#   kernelspec:
+#     display_name: Python 3 (ipykernel)
+#     language: python
+#     name: python3
+# ---
+
+# %% [markdown]
+# # Benchmark metadata extraction
+#
+# Here we compare the speed of reading global attributes
+# with `xr.open_dataset` vs. the header-only reader
+# on a directory of synthetic input4MIPs files.
+# We then compare the parallelisation settings of `extract_files_metadata`.
+
+# %%
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+
+from benchmarking import time_functions_interleaved, write_synthetic_input4mips_files
+from catalogue import SOURCE_ID_REGISTRY, extract_files_metadata, read_global_attrs
+
+# %%
+N_FILES = 3000
+
+# %%
+tmp_dir = Path(tempfile.mkdtemp())
+files = write_synthetic_input4mips_files(tmp_dir, n_files=N_FILES)
+len(files)
+
+
+# %%
+def read_attrs_open_dataset(fps: list[Path]) -> list[dict]:
+    return [xr.open_dataset(fp, decode_times=False).attrs for fp in fps]
+
+
+def read_attrs_header_only(fps: list[Path]) -> list[dict]:
+    return [read_global_attrs(fp) for fp in fps]
+
+
+# %%
+if read_attrs_open_dataset(files[:10]) != read_attrs_header_only(files[:10]):
+    raise AssertionError
+
+# %%
+# Calls are interleaved (with alternating order) and we report the median,
+# so neither reader benefits from the other warming the OS page cache
+timings = pd.Series(
+    time_functions_interleaved(
+        {
+            "xr.open_dataset": read_attrs_open_dataset,
+            "header-only": read_attrs_header_only,
+        },
+        files,
+        n_repeats=5,
+    ),
+    name="median wall time (s)",
+)
+timings.to_frame().assign(speed_up=timings["xr.open_dataset"] / timings)
+
+
+# %% [markdown]
+# ## Parallelisation settings
+#
+# Serial parsing, serial parsing with prefetching threads
+# and a pool of processes.
+# On a local disk the files are (mostly) in the page cache,
+# so prefetching can't help much and process start-up dominates.
+# Re-run this with `tmp_dir` on the (high-latency) filesystem
+# where the data lives to see whether either pays off there.
+
+# %%
+settings = {
+    "serial": dict(n_workers=1, n_prefetch_threads=0),
+    "serial, 8 prefetch threads": dict(n_workers=1, n_prefetch_threads=8),
+    "4 processes": dict(n_workers=4),
+    "8 processes": dict(n_workers=8),
+}
+
+
+def extract_with(kwargs: dict) -> Callable[[list[Path]], list[dict]]:
+    return lambda fps: extract_files_metadata(fps, SOURCE_ID_REGISTRY, **kwargs)
+
+
+# %%
+expected = extract_files_metadata(files[:100], SOURCE_ID_REGISTRY)
+for kwargs in settings.values():
+    if extract_with(kwargs)(files[:100]) != expected:
+        raise AssertionError(kwargs)
+
+# %%
+parallel_timings = pd.Series(
+    time_functions_interleaved(
+        {name: extract_with(kwargs) for name, kwargs in settings.items()},
+        files,
+        n_repeats=3,
+    ),
+    name="median wall time (s)",
+)
+parallel_timings.to_frame().assign(
+    speed_up=parallel_timings["serial"] / parallel_timings
+)
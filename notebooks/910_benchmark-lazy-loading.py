@@ -0,0 +1,82 @@
+# ---
+# jupyter:
+#   jupytext:
+#     text_representation:
+#       extension: .py
+#       format_name: percent
+#       format_version: '1.3'
+#       jupytext_version: 1.15.2
+#   kernelspec:
+#     display_name: Python 3 (ipykernel)
+#     language: python
+#     name: python3
+# ---
+
+# %% [markdown]
+# # Benchmark lazy loading
+#
+# Here we compare the wall time and peak memory use
+# of loading CMIP data eagerly vs. lazily.
+# Each load is done in a fresh process
+# so that the peak memory use of each load is isolated.
+
+# %%
+import pandas as pd
+from esgpull.cli.utils import init_esgpull
+
+from benchmarking import measure_wall_time_and_peak_rss
+from catalogue import SOURCE_ID_REGISTRY, FileCatalogue
+from loading import load_cmip6_data, load_cmip7_data, normalise_variable_names
+from utils import INTERIM_DATA_DIR
+
+# %%
+CMIP6_SOURCE_ID = "UoM-CMIP-1-2-0"
+CMIP7_COMPARE_SOURCE_ID = "CR-CMIP-0-4-0"
+VARIABLES = ["co2", "ch4", "n2o", "cfc12", "hfc134a"]
+
+# %%
+esg = init_esgpull(verbosity=0, load_db=False)
+data_path = esg.config.paths.data
+
+files_to_parse = [*data_path.rglob("*gm*.nc"), *data_path.rglob("*gr1-GMNHSH*.nc")]
+file_catalogue = FileCatalogue(INTERIM_DATA_DIR / "file-catalogue.sqlite")
+db = file_catalogue.get_db(
+    files_to_parse, source_id_registry=SOURCE_ID_REGISTRY, n_workers=1
+)
+db["variable_normalised"] = db["variable_id"].apply(normalise_variable_names)
+db = db[db["frequency"] == "yr"]
+
+# %%
+res_l = []
+for variable in VARIABLES:
+    for source_id, loader in (
+        (CMIP6_SOURCE_ID, load_cmip6_data),
+        (CMIP7_COMPARE_SOURCE_ID, load_cmip7_data),
+    ):
+        fps = db[
+            (db["variable_normalised"] == variable) & (db["source_id"] == source_id)
+        ]["filepath"].tolist()
+        if not fps:
+            continue
+
+        for lazy in (False, True):
+            wall_time, peak_rss = measure_wall_time_and_peak_rss(loader, fps, lazy=lazy)
+            res_l.append(
+                {
+                    "variable": variable,
+                    "source_id": source_id,
+                    "mode": "lazy" if lazy else "eager",
+                    "wall time (s)": wall_time,
+                    "peak RSS (MB)": peak_rss,
+                }
+            )
+
+res = pd.DataFrame(res_l)
+res
+
+# %%
+res.pivot_table(
+    index=["variable", "source_id"],
+    columns="mode",
+    values=["wall time (s)", "peak RSS (MB)"],
+)
@@ -0,0 +1,89 @@
+# ---
+# jupyter:
+#   jupytext:
+#     text_representation:
+#       extension: .py
+#       format_name: percent
+#       format_version: '1.3'
+#       jupytext_version: 1.15.2
+#   kernelspec:
+#     display_name: Python 3 (ipykernel)
+#     language: python
+#     name: python3
+# ---
+
+# %% [markdown]
+# # Benchmark annual-mean calculation
+#
+# Here we compare the speed of xarray's groupby
+# with our segmented reduction for calculating annual-means.
+# We do this for yearly and monthly data,
+# for all gases and source IDs we have.
+
+# %%
+import pandas as pd
+import tqdm
+import xarray as xr
+from esgpull.cli.utils import init_esgpull
+
+from benchmarking import time_function
+from catalogue import SOURCE_ID_REGISTRY, FileCatalogue
+from loading import (
+    annual_mean,
+    load_cmip6_data,
+    load_cmip7_data,
+    normalise_variable_names,
+)
+from utils import INTERIM_DATA_DIR
+
+# %%
+esg = init_esgpull(verbosity=0, load_db=False)
+data_path = esg.config.paths.data
+
+files_to_parse = [*data_path.rglob("*gm*.nc"), *data_path.rglob("*gr1-GMNHSH*.nc")]
+file_catalogue = FileCatalogue(INTERIM_DATA_DIR / "file-catalogue.sqlite")
+db = file_catalogue.get_db(
+    files_to_parse, source_id_registry=SOURCE_ID_REGISTRY, n_workers=1
+)
+db["variable_normalised"] = db["variable_id"].apply(normalise_variable_names)
+db = db[db["frequency"].isin(["yr", "mon"])]
+
+
+# %%
+def annual_mean_groupby(ds: xr.Dataset) -> xr.Dataset:
+    return ds.drop_vars("month").groupby("year").mean()
+
+
+# %%
+res_l = []
+for (variable, source_id, frequency), gdf in tqdm.tqdm(
+    db.groupby(["variable_normalised", "source_id", "frequency"])
+):
+    fps = gdf["filepath"].tolist()
+    if "UoM" in source_id:
+        ds = load_cmip6_data(fps, lazy=True, fast_time=True)
+    else:
+        ds = load_cmip7_data(fps, lazy=True, fast_time=True)
+
+    ds = ds.drop_vars([v for v in ds.data_vars if "bnds" in v])
+
+    xr.testing.assert_allclose(annual_mean_groupby(ds), annual_mean(ds))
+
+    res_l.append(
+        {
+            "variable": variable,
+            "source_id": source_id,
+            "frequency": frequency,
+            "groupby (s)": time_function(annual_mean_groupby, ds),
+            "reduceat (s)": time_function(annual_mean, ds),
+        }
+    )
+
+res = pd.DataFrame(res_l)
+res["speed_up"] = res["groupby (s)"] / res["reduceat (s)"]
+res
+
+# %%
+res.groupby(["frequency", "source_id"])[
+    ["groupby (s)", "reduceat (s)", "speed_up"]
+].median()
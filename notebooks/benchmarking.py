@@ -0,0 +1,191 @@
+"""
+Helpers for benchmarking the analysis
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import resource
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import xarray as xr
+
+
+def write_synthetic_input4mips_files(
+    root: Path,
+    n_files: int,
+    source_id: str = "CR-CMIP-0-4-0",
+    n_years: int = 275,
+) -> list[Path]:
+    """
+    Write synthetic, global-mean, yearly input4MIPs-style files
+
+    The files follow the input4MIPs DRS,
+    so they can be parsed like the real files.
+    Each file gets its own variable ID.
+
+    Parameters
+    ----------
+    root
+        Root directory in which to write the files
+
+    n_files
+        Number of files to write
+
+    source_id
+        Source ID to use in the paths and metadata
+
+    n_years
+        Number of years of data to write in each file
+
+    Returns
+    -------
+        Paths of the written files
+    """
+    start_year = 1750
+    end_year = start_year + n_years - 1
+    time_axis = xr.cftime_range(f"{start_year}-07-01", periods=n_years, freq="YS-JUL")
+
+    out = []
+    for i in range(n_files):
+        variable_id = f"gas{i:05d}"
+        ds = xr.Dataset(
+            data_vars={variable_id: ("time", np.linspace(0.0, 1.0, n_years))},
+            coords={"time": time_axis},
+            attrs={
+                "activity_id": "input4MIPs",
+                "dataset_category": "GHGConcentrations",
+                "frequency": "yr",
+                "grid_label": "gm",
+                "institution_id": "CR",
+                "mip_era": "CMIP6Plus",
+                "realm": "atmos",
+                "source_id": source_id,
+                "target_mip": "CMIP",
+                "variable_id": variable_id,
+            },
+        )
+        ds[variable_id].attrs["units"] = "ppt"
+
+        out_dir = (
+            root
+            / "input4MIPs"
+            / "CMIP6Plus"
+            / "CMIP"
+            / "CR"
+            / source_id
+            / "atmos"
+            / "yr"
+            / variable_id
+            / "gm"
+            / "v20240101"
+        )
+        out_dir.mkdir(exist_ok=True, parents=True)
+        out_file = out_dir / (
+            f"{variable_id}_input4MIPs_GHGConcentrations_CMIP_{source_id}_gm_"
+            f"{start_year}-{end_year}.nc"
+        )
+        ds.to_netcdf(out_file)
+        out.append(out_file)
+
+    return out
+
+
+def time_function(
+    func: Callable[..., Any], *args: Any, n_repeats: int = 3, **kwargs: Any
+) -> float:
+    """
+    Get the best wall time of calling `func` over `n_repeats` calls
+
+    Returns
+    -------
+        Best wall time in seconds
+    """
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def time_functions_interleaved(
+    funcs: dict[str, Callable[..., Any]], *args: Any, n_repeats: int = 5, **kwargs: Any
+) -> dict[str, float]:
+    """
+    Get the median wall time of several functions, interleaving their calls
+
+    In each round, every function is called once,
+    with the order of the calls rotated between rounds.
+    Hence no function is systematically helped (or hindered)
+    by what ran before it (e.g. a warm OS page cache).
+
+    Parameters
+    ----------
+    funcs
+        Functions to time, keyed by a label
+
+    *args
+        Passed to each function
+
+    n_repeats
+        Number of rounds
+
+    **kwargs
+        Passed to each function
+
+    Returns
+    -------
+        Median wall time in seconds of each function
+    """
+    labels = list(funcs)
+    times: dict[str, list[float]] = {label: [] for label in labels}
+    for i in range(n_repeats):
+        for label in labels[i % len(labels) :] + labels[: i % len(labels)]:
+            start = time.perf_counter()
+            funcs[label](*args, **kwargs)
+            times[label].append(time.perf_counter() - start)
+
+    return {
+        label: float(np.median(label_times)) for label, label_times in times.items()
+    }
+
+
+def _call_and_measure(
+    func: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]
+) -> tuple[float, float]:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    wall_time = time.perf_counter() - start
+
+    # On linux, ru_maxrss is in kilobytes
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return wall_time, peak_rss_mb
+
+
+def measure_wall_time_and_peak_rss(
+    func: Callable[..., Any], *args: Any, **kwargs: Any
+) -> tuple[float, float]:
+    """
+    Measure the wall time and peak memory use of calling `func`
+
+    The call is made in a fresh process,
+    so that the peak memory use isn't polluted by anything else
+    (e.g. whatever else has been done in the notebook's kernel).
+    As a result, `func` must be importable (i.e. not defined in a notebook).
+
+    Returns
+    -------
+        Wall time (s) and peak resident set size (MB) of the call
+    """
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(_call_and_measure, func, args, kwargs).result()
@@ -0,0 +1,128 @@
+"""
+Content-based skipping of build steps
+
+A bit like `make`, but based on content rather than timestamps.
+Next to each output, we write a manifest which records
+the hashes of the inputs it was built from,
+the version of the code which built it
+and the hash of the output itself.
+If none of these have changed, the output doesn't need to be rebuilt.
+Manifests are local build state, so they are git-ignored.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+MANIFEST_SUFFIX = ".build.json"
+"""Suffix added to an output's name to get the name of its manifest"""
+
+
+def get_manifest_path(out_file: Path) -> Path:
+    """
+    Get the path to the manifest of an output
+    """
+    out_file = Path(out_file)
+
+    return out_file.with_name(f"{out_file.name}{MANIFEST_SUFFIX}")
+
+
+def hash_file(file: Path) -> str:
+    """
+    Get the SHA256 hash of a file's contents
+    """
+    with open(file, "rb") as fh:
+        return hashlib.file_digest(fh, "sha256").hexdigest()
+
+
+def get_build_info(inputs: Iterable[Path], version: str) -> dict[str, Any]:
+    """
+    Get the information which determines whether an output is up to date
+
+    Parameters
+    ----------
+    inputs
+        Inputs from which the output is built
+
+    version
+        Version of the code which builds the output
+
+    Returns
+    -------
+        Build information.
+        Inputs are identified by their name (not their full path),
+        so moving e.g. a download cache doesn't trigger a rebuild.
+    """
+    return {
+        "version": version,
+        "inputs": [[Path(fp).name, hash_file(fp)] for fp in inputs],
+    }
+
+
+def is_up_to_date(out_file: Path, inputs: Iterable[Path], version: str) -> bool:
+    """
+    Check whether an output is up to date
+
+    Parameters
+    ----------
+    out_file
+        Output to check
+
+    inputs
+        Inputs from which the output is built
+
+    version
+        Version of the code which builds the output
+
+    Returns
+    -------
+        `True` if the output exists, hasn't been modified since it was built
+        and was built from the same inputs by the same version of the code
+    """
+    out_file = Path(out_file)
+    manifest_path = get_manifest_path(out_file)
+    if not (out_file.exists() and manifest_path.exists()):
+        return False
+
+    manifest = json.loads(manifest_path.read_text())
+
+    return manifest["build"] == get_build_info(inputs, version) and manifest[
+        "output"
+    ] == hash_file(out_file)
+
+
+def record_build(out_file: Path, inputs: Iterable[Path], version: str) -> Path:
+    """
+    Record that an output was built
+
+    Parameters
+    ----------
+    out_file
+        Output which was built
+
+    inputs
+        Inputs from which the output was built
+
+    version
+        Version of the code which built the output
+
+    Returns
+    -------
+        Path to the written manifest
+    """
+    manifest_path = get_manifest_path(out_file)
+    manifest_path.write_text(
+        json.dumps(
+            {
+                "build": get_build_info(inputs, version),
+                "output": hash_file(out_file),
+            },
+            indent=2,
+        )
+    )
+
+    return manifest_path
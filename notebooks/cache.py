@@ -0,0 +1,319 @@
+"""
+Cache of normalised, annual-mean CMIP data
+
+Each entry holds the data for one (source ID, variable) combination.
+Entries are keyed by the checksums of the input files
+and the version of the loading code,
+so only stale entries are rebuilt (e.g. when a new ESGF version lands).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pandas as pd
+import tqdm
+import xarray as xr
+
+from loading import load_annual_mean
+
+if TYPE_CHECKING:
+    # Not needed at runtime, and slow to import
+    from catalogue import FileCatalogue
+
+LOADER_VERSION = "2"
+"""
+Version of the loading code
+
+Bump this whenever the loading code changes
+in a way which changes its output.
+This invalidates all existing cache entries.
+"""
+
+LOSSY_ENCODING_KEYS = ("dtype", "scale_factor", "add_offset")
+"""Encoding keys which can make writing data to netCDF lossy"""
+
+
+class AnnualMeanCache:
+    """
+    On-disk cache of normalised, annual-mean data
+
+    Entries are stored as netCDF files,
+    with a JSON file alongside that records the entry's key.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        file_catalogue: FileCatalogue,
+        loader: Callable[[str, list[Path]], xr.Dataset] = load_annual_mean,
+        loader_version: str = LOADER_VERSION,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.file_catalogue = file_catalogue
+        self.loader = loader
+        self.loader_version = loader_version
+
+    def get_entry_path(self, source_id: str, variable: str) -> Path:
+        """
+        Get the path to the entry for a given source ID and variable
+        """
+        return self.cache_dir / source_id / f"{variable}.nc"
+
+    def get_key(self, fps: list[Path]) -> str:
+        """
+        Get the key of an entry generated from `fps`
+        """
+        checksums = self.file_catalogue.get_checksums(fps)
+        key_info = {
+            "loader_version": self.loader_version,
+            "inputs": sorted(checksums.values()),
+        }
+
+        return hashlib.sha256(json.dumps(key_info, sort_keys=True).encode()).hexdigest()
+
+    def is_fresh(self, source_id: str, variable: str, fps: list[Path]) -> bool:
+        """
+        Check whether the entry for a source ID and variable is up to date
+        """
+        entry_path = self.get_entry_path(source_id, variable)
+        key_path = entry_path.with_suffix(".json")
+        if not (entry_path.exists() and key_path.exists()):
+            return False
+
+        return json.loads(key_path.read_text())["key"] == self.get_key(fps)
+
+    def get(self, source_id: str, variable: str, fps: list[Path]) -> xr.Dataset:
+        """
+        Get data, loading from the cache if possible
+
+        Parameters
+        ----------
+        source_id
+            Source ID of the data
+
+        variable
+            (Normalised) variable of the data
+
+        fps
+            Raw files from which the data is generated
+
+        Returns
+        -------
+            Normalised, annual-mean data
+        """
+        entry_path = self.get_entry_path(source_id, variable)
+        if not self.is_fresh(source_id, variable, fps):
+            out = self.loader(source_id, fps)
+
+            entry_path.parent.mkdir(exist_ok=True, parents=True)
+            # Write then move so we never leave a half-written entry behind
+            tmp_path = entry_path.with_suffix(".nc.tmp")
+            out.to_netcdf(tmp_path)
+            tmp_path.replace(entry_path)
+            entry_path.with_suffix(".json").write_text(
+                json.dumps({"key": self.get_key(fps)})
+            )
+
+        # Always load from disk, so fresh and cached results are identical
+        return xr.load_dataset(entry_path)
+
+
+def _get_timed(
+    cache: AnnualMeanCache, source_id: str, variable: str, fps: list[Path]
+) -> tuple[xr.Dataset, float, int]:
+    start = time.perf_counter()
+    out = cache.get(source_id, variable, fps)
+
+    return out, time.perf_counter() - start, os.getpid()
+
+
+def write_to_store(ds: xr.Dataset, store_dir: Path, variable: str) -> Path:
+    """
+    Write the data for a single variable to a store
+
+    Parameters
+    ----------
+    ds
+        Data to write.
+        The data is written with its in-memory dtypes,
+        ignoring any encoding it picked up from the files it came from
+        (e.g. CMIP6's float32), so the store is lossless.
+
+    store_dir
+        Directory of the store
+
+    variable
+        Variable to which the data belongs
+
+    Returns
+    -------
+        Path to which the data was written
+    """
+    ds = ds.copy()
+    for da in ds.variables.values():
+        for key in LOSSY_ENCODING_KEYS:
+            da.encoding.pop(key, None)
+
+    out_path = Path(store_dir) / f"{variable}.nc"
+    out_path.parent.mkdir(exist_ok=True, parents=True)
+    # Write then move so we never leave a half-written file behind
+    tmp_path = out_path.with_suffix(".nc.tmp")
+    ds.to_netcdf(tmp_path)
+    tmp_path.replace(out_path)
+
+    return out_path
+
+
+def get_store_variables(store_dir: Path) -> list[str]:
+    """
+    Get the variables which are in a store
+    """
+    return sorted(p.stem for p in Path(store_dir).glob("*.nc"))
+
+
+def open_store(store_dir: Path, variables: list[str], lazy: bool = True) -> xr.Dataset:
+    """
+    Open data from a store
+
+    Parameters
+    ----------
+    store_dir
+        Directory of the store
+
+    variables
+        Variables to open
+
+    lazy
+        Open the data lazily.
+        If `False`, the data is read straight into memory,
+        which avoids the overhead of dask for small data.
+
+    Returns
+    -------
+        Combined data for `variables`
+    """
+    fps = [Path(store_dir) / f"{variable}.nc" for variable in sorted(variables)]
+    if lazy:
+        return xr.open_mfdataset(
+            fps,
+            combine="by_coords",
+            join="outer",
+            combine_attrs="drop_conflicts",
+        )
+
+    return xr.merge(
+        [xr.load_dataset(fp) for fp in fps],
+        join="outer",
+        combine_attrs="drop_conflicts",
+    )
+
+
+def load_annual_means(
+    to_load: pd.DataFrame,
+    cache: AnnualMeanCache,
+    store_dir: Path,
+    n_workers: int = 1,
+) -> tuple[xr.Dataset, pd.DataFrame]:
+    """
+    Load annual-mean data for many variables and source IDs
+
+    Each (variable, source ID) combination is an independent task.
+    As soon as all the tasks for a variable are done,
+    the variable's data is written to a store (one netCDF file per variable)
+    and dropped from memory.
+    Hence, memory use is bounded by the variables in flight,
+    rather than growing with the number of variables.
+    The result doesn't depend on the order in which tasks finish.
+
+    Parameters
+    ----------
+    to_load
+        Files to load.
+        Must have columns `variable_normalised`, `mip_era`, `source_id`
+        and `filepath`.
+
+    cache
+        Cache from which to get the data
+
+    store_dir
+        Directory of the store to write to
+
+    n_workers
+        Number of processes to use.
+        If one, everything is loaded serially in this process.
+        Workers are spawned (not forked), so they start from a clean state.
+
+    Returns
+    -------
+        Loaded data (opened lazily from the store)
+        and the time taken by each task
+    """
+    tasks = [
+        (variable, source_id, gdf["filepath"].tolist())
+        for (variable, _, source_id), gdf in to_load.groupby(
+            ["variable_normalised", "mip_era", "source_id"]
+        )
+    ]
+    desc = "Dataset to load"
+
+    n_tasks_remaining = Counter(variable for variable, _, _ in tasks)
+    in_flight: dict[str, dict[int, xr.Dataset]] = {}
+    timings_l: list[dict[str, str | float | int]] = [{} for _ in tasks]
+
+    def record_result(i: int, res: tuple[xr.Dataset, float, int]) -> None:
+        variable, source_id, _ = tasks[i]
+        ds, seconds, pid = res
+        timings_l[i] = {
+            "variable": variable,
+            "source_id": source_id,
+            "time (s)": seconds,
+            "pid": pid,
+        }
+
+        in_flight.setdefault(variable, {})[i] = ds
+        n_tasks_remaining[variable] -= 1
+        if n_tasks_remaining[variable] == 0:
+            variable_results = in_flight.pop(variable)
+            write_to_store(
+                xr.concat(
+                    [variable_results[j] for j in sorted(variable_results)],
+                    "source_id",
+                    combine_attrs="drop_conflicts",
+                ),
+                store_dir=store_dir,
+                variable=variable,
+            )
+
+    if n_workers > 1:
+        # Spawn, so workers don't inherit this process' HDF5/netCDF state
+        # (or locks held by its threads)
+        with ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(_get_timed, cache, source_id, variable, fps): i
+                for i, (variable, source_id, fps) in enumerate(tasks)
+            }
+            for future in tqdm.tqdm(
+                as_completed(futures), total=len(futures), desc=desc
+            ):
+                record_result(futures[future], future.result())
+
+    else:
+        for i, (variable, source_id, fps) in enumerate(tqdm.tqdm(tasks, desc=desc)):
+            record_result(i, _get_timed(cache, source_id, variable, fps))
+
+    loaded = open_store(store_dir, list(n_tasks_remaining))
+    timings = pd.DataFrame(timings_l)
+
+    return loaded, timings
@@ -0,0 +1,470 @@
+"""
+Catalogue of CMIP file metadata
+
+Extracting metadata means opening every file,
+which is slow when there are thousands of them.
+Hence we keep an on-disk catalogue (SQLite)
+keyed by path, size and modification time
+so that only new or changed files are re-parsed.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import re
+import sqlite3
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import netCDF4
+import pandas as pd
+import tqdm
+from input4mips_validation.cvs.drs import DataReferenceSyntax
+
+DRS_DEFAULT = DataReferenceSyntax(
+    directory_path_template="<activity_id>/<mip_era>/<target_mip>/<institution_id>/<source_id>/<realm>/<frequency>/<variable_id>/<grid_label>/v<version>",
+    directory_path_example="not_used",
+    filename_template="<variable_id>_<activity_id>_<dataset_category>_<target_mip>_<source_id>_<grid_label>[_<time_range>].nc",
+    filename_example="not_used",
+)
+
+CATALOGUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checksums (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+PREFETCH_BYTES = 2**20
+"""
+Number of bytes to prefetch from the start of each file
+
+This covers the header (and hence the global attributes)
+of the files we catalogue.
+"""
+
+PREFETCH_THREADS = 8
+"""Default number of threads to use for prefetching files"""
+
+
+def _to_json_compatible(obj: Any) -> Any:
+    # Attributes read from netCDF files are often numpy scalars or arrays
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+
+    if isinstance(obj, Path):
+        return str(obj)
+
+    msg = f"Can't serialise {obj!r} ({type(obj)})"
+    raise TypeError(msg)
+
+
+def read_global_attrs(file: Path) -> dict[str, Any]:
+    """
+    Read the global attributes of a netCDF file
+
+    Only the file's header is read
+    and the file handle is released before returning.
+    This is much cheaper than `xr.open_dataset(file).attrs`,
+    which builds the entire dataset (and doesn't close the file).
+    """
+    with netCDF4.Dataset(file, "r") as ds:
+        return {k: ds.getncattr(k) for k in ds.ncattrs()}
+
+
+class SourceIDRegistry(Mapping[str, DataReferenceSyntax]):
+    """
+    Registry of source IDs and the DRS to use for parsing their files' paths
+
+    Files are resolved to a source ID by looking up their directory names,
+    falling back to searching the filename (and then the full path)
+    with a single, pre-compiled regular expression.
+    The regular expression prefers the longest match,
+    so source IDs which are prefixes of other source IDs
+    are handled correctly.
+    """
+
+    def __init__(
+        self, source_id_drs_map: Mapping[str, DataReferenceSyntax] | None = None
+    ):
+        self._drs: dict[str, DataReferenceSyntax] = {}
+        self._pattern: re.Pattern[str] | None = None
+        if source_id_drs_map is not None:
+            for source_id, drs in source_id_drs_map.items():
+                self.register(source_id, drs)
+
+    def __getitem__(self, source_id: str) -> DataReferenceSyntax:
+        return self._drs[source_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._drs)
+
+    def __len__(self) -> int:
+        return len(self._drs)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({sorted(self._drs)})"
+
+    def register(self, source_id: str, drs: DataReferenceSyntax = DRS_DEFAULT) -> None:
+        """
+        Register a source ID
+
+        Parameters
+        ----------
+        source_id
+            Source ID to register
+
+        drs
+            DRS to use for parsing the paths of files from this source ID
+        """
+        self._drs[source_id] = drs
+        # Rebuilt lazily on next use
+        self._pattern = None
+
+    @property
+    def pattern(self) -> re.Pattern[str]:
+        """
+        Regular expression which matches any registered source ID
+        """
+        if self._pattern is None:
+            alternatives = "|".join(
+                re.escape(source_id)
+                for source_id in sorted(self._drs, key=len, reverse=True)
+            )
+            self._pattern = re.compile(f"(?:^|[_/])({alternatives})(?=[_/.]|$)")
+
+        return self._pattern
+
+    def resolve(self, file: Path) -> tuple[str, DataReferenceSyntax]:
+        """
+        Resolve the source ID of a file
+
+        Parameters
+        ----------
+        file
+            File to resolve
+
+        Returns
+        -------
+            Source ID and the DRS to use for parsing the file's path
+
+        Raises
+        ------
+        NotImplementedError
+            No registered source ID matches `file`
+        """
+        for part in reversed(file.parent.parts):
+            if part in self._drs:
+                return part, self._drs[part]
+
+        match = self.pattern.search(file.name) or self.pattern.search(file.as_posix())
+        if match is None:
+            msg = f"No matching source ID found in {str(file)}"
+            raise NotImplementedError(msg)
+
+        source_id = match.group(1)
+
+        return source_id, self._drs[source_id]
+
+
+SOURCE_ID_REGISTRY = SourceIDRegistry(
+    {
+        "CR-CMIP-0-3-0": DRS_DEFAULT,
+        "CR-CMIP-0-4-0": DRS_DEFAULT,
+        "CR-CMIP-testing": DRS_DEFAULT,
+        "UoM-CMIP-1-2-0": DRS_DEFAULT,
+    }
+)
+"""
+Default registry of source IDs
+
+Further source IDs can be added with `SOURCE_ID_REGISTRY.register`.
+"""
+
+
+def extract_drs_metadata(
+    file: Path, source_id_registry: SourceIDRegistry
+) -> dict[str, Any]:
+    """
+    Extract metadata from a file's path and name
+    """
+    _, drs = source_id_registry.resolve(file)
+
+    return drs.extract_metadata_from_path(
+        file.parent
+    ) | drs.extract_metadata_from_filename(file.name)
+
+
+def extract_file_metadata(
+    file: Path, source_id_registry: SourceIDRegistry
+) -> dict[str, Any]:
+    """
+    Extract metadata from a file's path, name and global attributes
+    """
+    return extract_drs_metadata(file, source_id_registry) | read_global_attrs(file)
+
+
+def prefetch_file(file: Path, n_bytes: int = PREFETCH_BYTES) -> Path:
+    """
+    Read the start of a file, so it is in the operating system's page cache
+
+    This only uses plain (binary) reads, never netCDF-C/HDF5,
+    so it is safe to call from many threads at once.
+    A subsequent `read_global_attrs(file)` then doesn't have to wait
+    on the filesystem.
+
+    Parameters
+    ----------
+    file
+        File to prefetch
+
+    n_bytes
+        Number of bytes to read from the start of the file
+
+    Returns
+    -------
+        `file` (so this can be used with `ThreadPoolExecutor.map`)
+    """
+    with open(file, "rb") as fh:
+        fh.read(n_bytes)
+
+    return file
+
+
+def extract_files_metadata(
+    files: list[Path],
+    source_id_registry: SourceIDRegistry,
+    n_workers: int = 1,
+    n_prefetch_threads: int = PREFETCH_THREADS,
+) -> list[dict[str, Any]]:
+    """
+    Extract metadata from many files, optionally in parallel
+
+    The output is the same, whatever the parallelisation settings.
+    See notebook 900 for benchmarks of the different settings.
+
+    Parameters
+    ----------
+    files
+        Files from which to extract metadata
+
+    source_id_registry
+        Registry to use for resolving each file's source ID and DRS
+
+    n_workers
+        Number of processes to use.
+        netCDF-C/HDF5 isn't thread-safe,
+        so we use (spawned) processes rather than threads.
+        Each process takes a few seconds to start,
+        so this only helps for many files on high-latency filesystems.
+        If one, files are parsed serially in this process
+        (the default, as this is fastest on local filesystems).
+
+    n_prefetch_threads
+        Number of threads to use for prefetching files when parsing serially
+        (see `prefetch_file`).
+        Files are prefetched ahead of the parsing,
+        so waiting on the filesystem overlaps with parsing.
+        If zero, files aren't prefetched.
+
+    Returns
+    -------
+        Metadata for each file in `files` (in the same order as `files`)
+    """
+    desc = "Extracting file metadata"
+    if n_workers <= 1:
+        if n_prefetch_threads <= 0:
+            return [
+                extract_file_metadata(file, source_id_registry)
+                for file in tqdm.tqdm(files, desc=desc)
+            ]
+
+        # Threads only read raw bytes, all netCDF-C/HDF5 calls stay in this thread.
+        # `map` submits everything up front and yields in order,
+        # so prefetching runs ahead of the parsing.
+        with ThreadPoolExecutor(max_workers=n_prefetch_threads) as executor:
+            return [
+                extract_file_metadata(file, source_id_registry)
+                for file in tqdm.tqdm(
+                    executor.map(prefetch_file, files), total=len(files), desc=desc
+                )
+            ]
+
+    # Spawn, so the workers don't inherit this process' HDF5/netCDF state
+    with ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        metadata = executor.map(
+            partial(extract_file_metadata, source_id_registry=source_id_registry),
+            files,
+            chunksize=max(1, len(files) // (4 * n_workers)),
+        )
+
+        return list(tqdm.tqdm(metadata, total=len(files), desc=desc))
+
+
+class FileCatalogue:
+    """
+    On-disk catalogue of file metadata
+
+    Files are re-parsed only if their size or modification time
+    differs from what is stored in the catalogue.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        with self._connect() as conn:
+            conn.executescript(CATALOGUE_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Generous timeout as many processes may be writing at once
+        conn = sqlite3.connect(self.db_path, timeout=60.0)
+        try:
+            # Commits (or rolls back) the transaction, but doesn't close
+            with conn:
+                yield conn
+
+        finally:
+            conn.close()
+
+    def get_db(
+        self,
+        files: Iterable[Path],
+        source_id_registry: SourceIDRegistry,
+        n_workers: int = 1,
+        n_prefetch_threads: int = PREFETCH_THREADS,
+    ) -> pd.DataFrame:
+        """
+        Get the metadata database for `files`, re-parsing only if needed
+
+        Parameters
+        ----------
+        files
+            Files to include in the database
+
+        source_id_registry
+            Registry to use for resolving each file's source ID and DRS
+
+        n_workers
+            Number of processes to use for parsing new or changed files,
+            see `extract_files_metadata`
+
+        n_prefetch_threads
+            Number of threads to use for prefetching new or changed files,
+            see `extract_files_metadata`
+
+        Returns
+        -------
+            Metadata of `files`, one row per file (in the order of `files`)
+        """
+        files = [Path(f).absolute() for f in files]
+
+        with self._connect() as conn:
+            stored = {
+                path: (size, mtime_ns, metadata)
+                for path, size, mtime_ns, metadata in conn.execute(
+                    "SELECT path, size, mtime_ns, metadata FROM files"
+                )
+            }
+
+        db_l = []
+        to_parse = []
+        for file in files:
+            stat = file.stat()
+            key = str(file)
+            if key in stored and stored[key][:2] == (stat.st_size, stat.st_mtime_ns):
+                db_l.append(json.loads(stored[key][2]))
+            else:
+                db_l.append(None)
+                to_parse.append((len(db_l) - 1, file, stat))
+
+        parsed = extract_files_metadata(
+            [file for _, file, _ in to_parse],
+            source_id_registry,
+            n_workers=n_workers,
+            n_prefetch_threads=n_prefetch_threads,
+        )
+
+        updates = []
+        for (i, file, stat), metadata in zip(to_parse, parsed):
+            metadata_json = json.dumps(metadata, default=_to_json_compatible)
+            updates.append((str(file), stat.st_size, stat.st_mtime_ns, metadata_json))
+            # Round-trip so cold and warm starts give identical output
+            db_l[i] = json.loads(metadata_json)
+
+        if updates:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", updates
+                )
+
+        for file, metadata in zip(files, db_l):
+            metadata["filepath"] = file
+
+        return pd.DataFrame(db_l)
+
+    def get_checksums(self, files: Iterable[Path]) -> dict[Path, str]:
+        """
+        Get the SHA256 checksum of each file in `files`
+
+        Checksums are only re-calculated
+        if a file's size or modification time has changed,
+        so unchanged files' contents are never read.
+
+        Parameters
+        ----------
+        files
+            Files for which to get checksums
+
+        Returns
+        -------
+            Map from (absolute) file path to SHA256 checksum
+        """
+        files = [Path(f).absolute() for f in files]
+
+        with self._connect() as conn:
+            stored = {
+                path: (size, mtime_ns, sha256)
+                for path, size, mtime_ns, sha256 in conn.execute(
+                    "SELECT path, size, mtime_ns, sha256 FROM checksums"
+                )
+            }
+
+        out = {}
+        updates = []
+        for file in files:
+            stat = file.stat()
+            key = str(file)
+            if key in stored and stored[key][:2] == (stat.st_size, stat.st_mtime_ns):
+                out[file] = stored[key][2]
+                continue
+
+            with open(file, "rb") as fh:
+                sha256 = hashlib.file_digest(fh, "sha256").hexdigest()
+
+            updates.append((key, stat.st_size, stat.st_mtime_ns, sha256))
+            out[file] = sha256
+
+        if updates:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?)", updates
+                )
+
+        return out
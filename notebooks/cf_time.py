@@ -0,0 +1,159 @@
+"""
+Fast decoding of CF time axes to integer years and months
+
+Decoding with cftime creates a Python object for every timestep,
+which dominates load time for long or monthly series.
+If all we need downstream is the year (and month) of each timestep,
+we can get them with integer arithmetic in NumPy instead.
+"""
+
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import xarray as xr
+
+UNITS_REGEXP = re.compile(
+    r"^\s*(?P<unit>days|hours)\s+since\s+"
+    r"(?P<year>-?\d+)-(?P<month>\d{1,2})-(?P<day>\d{1,2})"
+    r"(?:[ T](?P<hour>\d{1,2}):(?P<minute>\d{1,2})"
+    r"(?::(?P<second>\d{1,2}(?:\.\d*)?))?)?"
+    r"\s*$"
+)
+
+GREGORIAN_REFORM_JDN = 2299161
+"""Julian day number of 1582-10-15, the first day of the Gregorian calendar"""
+
+DAYS_PER_MONTH = {
+    "noleap": np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    "all_leap": np.array([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]),
+    "360_day": np.full(12, 30),
+}
+CALENDAR_ALIASES = {
+    "gregorian": "standard",
+    "365_day": "noleap",
+    "366_day": "all_leap",
+}
+
+
+def _to_jdn(year: int, month: int, day: int, gregorian: bool) -> np.ndarray:
+    # Richards' algorithm, see e.g. https://en.wikipedia.org/wiki/Julian_day
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    out = day + (153 * m + 2) // 5 + 365 * y + y // 4
+    return np.where(gregorian, out - y // 100 + y // 400 - 32045, out - 32083)
+
+
+def _from_jdn(jdn: np.ndarray, gregorian: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Richards' algorithm, see e.g. https://en.wikipedia.org/wiki/Julian_day
+    f = jdn + 1401
+    f = np.where(gregorian, f + (((4 * jdn + 274277) // 146097) * 3) // 4 - 38, f)
+    e = 4 * f + 3
+    g = (e % 1461) // 4
+    h = 5 * g + 2
+    month = ((h // 153 + 2) % 12) + 1
+    year = e // 1461 - 4716 + (14 - month) // 12
+
+    return year, month
+
+
+def decode_year_month(
+    values: np.ndarray, units: str, calendar: str = "standard"
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Decode CF time values to integer years and months
+
+    Parameters
+    ----------
+    values
+        Encoded time values
+
+    units
+        CF units of `values` (only "days since" and "hours since" are supported)
+
+    calendar
+        CF calendar of `values`
+
+    Returns
+    -------
+        Year and month of each value.
+        `None` if the encoding isn't supported,
+        in which case the caller should fall back to decoding with cftime.
+    """
+    match = UNITS_REGEXP.match(units)
+    if match is None:
+        return None
+
+    calendar = calendar.lower()
+    calendar = CALENDAR_ALIASES.get(calendar, calendar)
+
+    ref_year = int(match.group("year"))
+    ref_month = int(match.group("month"))
+    ref_day = int(match.group("day"))
+    ref_day_fraction = (
+        int(match.group("hour") or 0) / 24
+        + int(match.group("minute") or 0) / (24 * 60)
+        + float(match.group("second") or 0) / (24 * 60 * 60)
+    )
+
+    offset_days = np.asarray(values, dtype=np.float64)
+    if match.group("unit") == "hours":
+        offset_days = offset_days / 24
+
+    offset_days = np.floor(offset_days + ref_day_fraction).astype(np.int64)
+
+    if calendar in DAYS_PER_MONTH:
+        days_per_month = DAYS_PER_MONTH[calendar]
+        days_per_year = days_per_month.sum()
+        month_starts = np.concatenate([[0], np.cumsum(days_per_month)])
+
+        day_of_year = month_starts[ref_month - 1] + ref_day - 1 + offset_days
+        year = ref_year + day_of_year // days_per_year
+        month = np.searchsorted(month_starts, day_of_year % days_per_year, side="right")
+
+    elif calendar in ("standard", "proleptic_gregorian", "julian"):
+        if calendar == "standard":
+            ref_gregorian = (ref_year, ref_month, ref_day) >= (1582, 10, 15)
+        else:
+            ref_gregorian = calendar == "proleptic_gregorian"
+
+        jdn = _to_jdn(ref_year, ref_month, ref_day, ref_gregorian) + offset_days
+
+        if calendar == "standard":
+            gregorian = jdn >= GREGORIAN_REFORM_JDN
+        else:
+            gregorian = np.full(jdn.shape, calendar == "proleptic_gregorian")
+
+        year, month = _from_jdn(jdn, gregorian)
+
+    else:
+        return None
+
+    if calendar in ("standard", "julian") and (year < 1).any():
+        # No year zero in these calendars, leave it to cftime
+        return None
+
+    return year, month
+
+
+def assign_year_month_coords(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Assign integer `year` and `month` co-ordinates along `ds`'s time dimension
+
+    `ds["time"]` must still be encoded (i.e. loaded with `decode_times=False`).
+    If its encoding isn't supported by `decode_year_month`,
+    we fall back to decoding with cftime.
+    """
+    time = ds["time"]
+    decoded = decode_year_month(
+        time.values, time.attrs["units"], time.attrs.get("calendar", "standard")
+    )
+    if decoded is None:
+        time_decoded = xr.decode_cf(ds[["time"]], use_cftime=True)["time"]
+        decoded = (time_decoded.dt.year.values, time_decoded.dt.month.values)
+
+    year, month = decoded
+
+    return ds.assign_coords(year=("time", year), month=("time", month))
@@ -0,0 +1,494 @@
+"""
+Command-line interface to the comparison of global-, annual-means
+
+The same analysis as `100_compare-global-annual-means.py`,
+but scriptable (e.g. for nightly runs).
+Each sub-command only imports what it needs,
+so e.g. `summary` doesn't pay for matplotlib, esgpull or the unit registry.
+
+Usage (from the repository's root)::
+
+    python notebooks/compare_ghg.py ingest
+    python notebooks/compare_ghg.py catalogue
+    python notebooks/compare_ghg.py load --variable co2 --variable ch4
+    python notebooks/compare_ghg.py summary --check
+    python notebooks/compare_ghg.py plots
+    python notebooks/compare_ghg.py projections --species HFC-134a --variable Mix_tot
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from utils import FIGURES_DIR, INTERIM_DATA_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import xarray as xr
+
+CMIP6_SOURCE_ID = "UoM-CMIP-1-2-0"
+CMIP7_COMPARE_SOURCE_ID = "CR-CMIP-0-4-0"
+
+FILE_CATALOGUE_PATH = INTERIM_DATA_DIR / "file-catalogue.sqlite"
+ANNUAL_MEAN_CACHE_DIR = INTERIM_DATA_DIR / "annual-mean-cache"
+ANNUAL_MEAN_STORE_DIR = INTERIM_DATA_DIR / "annual-mean-store"
+RADIATIVE_EFFICIENCIES_PATH = INTERIM_DATA_DIR / "radiative-efficiencies.json"
+
+COMPARISON_TIME_RANGES = (
+    range(1, 2025 + 1),
+    range(1825, 1875 + 1),
+    range(1940, 2025 + 1),
+    range(2000, 2025 + 1),
+    range(1750, 2025 + 1),
+)
+"""Time ranges for which we plot comparisons against other data sources"""
+
+
+def get_files_to_parse(data_paths: Sequence[Path] | None) -> list[Path]:
+    """
+    Get the files to parse
+
+    Parameters
+    ----------
+    data_paths
+        Paths in which to search for files.
+        If not supplied, esgpull's data path is used.
+
+    Returns
+    -------
+        Files to parse
+    """
+    if not data_paths:
+        from esgpull.cli.utils import init_esgpull
+
+        data_paths = [init_esgpull(verbosity=0, load_db=False).config.paths.data]
+
+    return [
+        fp
+        for data_path in data_paths
+        for pattern in ("*gm*.nc", "*gr1-GMNHSH*.nc")
+        for fp in Path(data_path).rglob(pattern)
+    ]
+
+
+def get_catalogue_db(args: argparse.Namespace) -> pd.DataFrame:
+    """
+    Get the catalogue of the files to parse, with normalised variable names
+    """
+    from catalogue import SOURCE_ID_REGISTRY, FileCatalogue
+    from loading import normalise_variable_names
+
+    for source_id in args.register_source_id:
+        SOURCE_ID_REGISTRY.register(source_id)
+
+    db = FileCatalogue(FILE_CATALOGUE_PATH).get_db(
+        get_files_to_parse(args.data_path),
+        source_id_registry=SOURCE_ID_REGISTRY,
+        n_workers=args.n_catalogue_workers,
+    )
+    db["variable_normalised"] = db["variable_id"].apply(normalise_variable_names)
+
+    return db
+
+
+def open_loaded(variables: Sequence[str] | None, lazy: bool) -> xr.Dataset:
+    """
+    Open loaded data from the annual-mean store
+
+    Parameters
+    ----------
+    variables
+        Variables to open. If not supplied, everything in the store.
+
+    lazy
+        Open lazily (see `cache.open_store`)
+
+    Returns
+    -------
+        Loaded data
+    """
+    from cache import get_store_variables, open_store
+
+    available = get_store_variables(ANNUAL_MEAN_STORE_DIR)
+    variables = list(variables) if variables else available
+    missing = sorted(set(variables) - set(available))
+    if not available or missing:
+        msg = (
+            f"Not in the store at {ANNUAL_MEAN_STORE_DIR}: {missing or 'anything'}. "
+            "Run the `load` sub-command first."
+        )
+        raise SystemExit(msg)
+
+    return open_store(ANNUAL_MEAN_STORE_DIR, variables, lazy=lazy)
+
+
+def get_differences(loaded: xr.Dataset, args: argparse.Namespace) -> xr.Dataset:
+    """
+    Get the differences between the source IDs we're comparing
+    """
+    from differences import check_for_gaps, compute_differences
+    from radiative_efficiencies import get_data_units, get_radiative_efficiencies
+
+    gases = sorted(v for v in loaded.data_vars if "bnds" not in v)
+    check_for_gaps(loaded, gases, years=range(1900, 2010 + 1))
+    data_units = get_data_units(loaded, gases)
+
+    return compute_differences(
+        loaded,
+        compare_source_id=args.compare_source_id,
+        base_source_id=args.base_source_id,
+        radiative_efficiencies=get_radiative_efficiencies(
+            data_units, cache_path=RADIATIVE_EFFICIENCIES_PATH
+        ),
+        radiative_efficiency_units=data_units,
+        gases=gases,
+    )
+
+
+def run_ingest(args: argparse.Namespace) -> int:
+    """
+    Download and process all the reference data archives
+    """
+    from ingestion import ZENODO_ARCHIVES, ingest_archives
+    from projections import PROJECTIONS_DIR, write_projections
+
+    out = ingest_archives(
+        ZENODO_ARCHIVES,
+        base_url=args.base_url,
+        cache_dir=args.cache_dir,
+        n_workers=args.n_workers,
+        force=args.force,
+    )
+    for name, out_file in out.items():
+        print(f"{name}: {out_file}")
+
+    # The archives are in the download cache now, so this is quick
+    written = write_projections(
+        base_url=args.base_url, cache_dir=args.cache_dir, force=args.force
+    )
+    print(f"Wrote {len(written)} projection partition(s) in {PROJECTIONS_DIR}")
+
+    return 0
+
+
+def run_catalogue(args: argparse.Namespace) -> int:
+    """
+    Update the file catalogue and print what is in it
+    """
+    db = get_catalogue_db(args)
+    print(
+        db.groupby(["source_id", "frequency"])["variable_normalised"]
+        .nunique()
+        .rename("n_variables")
+        .to_string()
+    )
+
+    return 0
+
+
+def run_load(args: argparse.Namespace) -> int:
+    """
+    Load annual-means into the store
+    """
+    from cache import AnnualMeanCache, load_annual_means
+    from catalogue import FileCatalogue
+
+    db = get_catalogue_db(args)
+    to_load = db[db["frequency"] == "yr"]
+    if args.variable:
+        to_load = to_load[to_load["variable_normalised"].isin(args.variable)]
+
+    _, load_timings = load_annual_means(
+        to_load,
+        AnnualMeanCache(
+            ANNUAL_MEAN_CACHE_DIR, file_catalogue=FileCatalogue(FILE_CATALOGUE_PATH)
+        ),
+        store_dir=ANNUAL_MEAN_STORE_DIR,
+        n_workers=args.n_workers,
+    )
+    print(load_timings.sort_values("time (s)", ascending=False).to_string())
+
+    return 0
+
+
+def run_summary(args: argparse.Namespace) -> int:
+    """
+    Print the maximum differences between the source IDs we're comparing
+    """
+    differences = get_differences(open_loaded(args.variable, lazy=False), args)
+
+    summary = differences[["absolute_max", "relative_max", "erf_max"]].to_dataframe()
+    summary["look_here"] = summary["erf_max"] > args.erf_threshold
+
+    if args.csv:
+        summary.to_csv(sys.stdout)
+    else:
+        print(f"{args.compare_source_id} - {args.base_source_id}")
+        print(summary.to_string(float_format="{:.3e}".format))
+
+    if args.check and summary["look_here"].any():
+        return 1
+
+    return 0
+
+
+def run_plots(args: argparse.Namespace) -> int:
+    """
+    Render all the figures
+    """
+    from plotting import build_comparison_frames
+    from reference_data import REFERENCE_SOURCE_SPECS, build_reference_store
+    from rendering import (
+        get_comparison_jobs,
+        get_difference_jobs,
+        get_palette,
+        render_figures,
+    )
+
+    loaded = open_loaded(args.variable, lazy=True)
+    gases = sorted(v for v in loaded.data_vars if "bnds" not in v)
+
+    comparison_frames = build_comparison_frames(
+        loaded, build_reference_store(REFERENCE_SOURCE_SPECS), gases
+    )
+    jobs = [
+        *get_comparison_jobs(
+            comparison_frames,
+            gases,
+            palette=get_palette(
+                base_source_id=args.base_source_id,
+                compare_source_id=args.compare_source_id,
+            ),
+            time_ranges=COMPARISON_TIME_RANGES,
+        ),
+        *get_difference_jobs(
+            loaded,
+            get_differences(loaded, args),
+            gases,
+            compare_source_id=args.compare_source_id,
+            base_source_id=args.base_source_id,
+        ),
+    ]
+
+    rendered = render_figures(
+        jobs, args.out_dir, n_workers=args.n_workers, force=args.force
+    )
+    print(f"Rendered {len(rendered)} of {len(jobs)} figures in {args.out_dir}")
+
+    return 0
+
+
+def run_projections(args: argparse.Namespace) -> int:
+    """
+    Print projections side by side, one column per scenario
+    """
+    from projections import PROJECTIONS_DIR, query_projections
+
+    projections = query_projections(
+        source=args.source or None,
+        scenario=args.scenario or None,
+        species=args.species or None,
+        variable=args.variable or None,
+        years=range(args.start_year, args.end_year + 1),
+    )
+    if projections.empty:
+        msg = (
+            f"No projections matching the query in {PROJECTIONS_DIR}. "
+            "Run the `ingest` sub-command first."
+        )
+        raise SystemExit(msg)
+
+    table = projections.pivot_table(
+        index=["species", "variable", "year"],
+        columns=["source", "scenario"],
+        values="value",
+    )
+
+    if args.csv:
+        table.to_csv(sys.stdout)
+    else:
+        print(table.to_string(float_format="{:.3e}".format))
+
+    return 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """
+    Get the command-line parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="compare-ghg",
+        description="Compare CMIP6 and CMIP7 GHG concentrations",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    source_ids = argparse.ArgumentParser(add_help=False)
+    source_ids.add_argument(
+        "--compare-source-id",
+        default=CMIP7_COMPARE_SOURCE_ID,
+        help="Source ID to compare (default: %(default)s)",
+    )
+    source_ids.add_argument(
+        "--base-source-id",
+        default=CMIP6_SOURCE_ID,
+        help="Source ID to compare against (default: %(default)s)",
+    )
+
+    variables = argparse.ArgumentParser(add_help=False)
+    variables.add_argument(
+        "--variable",
+        action="append",
+        default=[],
+        help="Variable to include (repeat for more). Default: all.",
+    )
+
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument(
+        "--n-workers",
+        type=int,
+        default=8,
+        help="Number of workers to use (default: %(default)s)",
+    )
+
+    files = argparse.ArgumentParser(add_help=False)
+    files.add_argument(
+        "--data-path",
+        action="append",
+        type=Path,
+        default=[],
+        help=(
+            "Directory in which to search for CMIP files (repeat for more). "
+            "Default: esgpull's data path."
+        ),
+    )
+    files.add_argument(
+        "--register-source-id",
+        action="append",
+        default=[],
+        help="Extra source ID to recognise (repeat for more)",
+    )
+    files.add_argument(
+        "--n-catalogue-workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of processes to use for parsing new or changed files "
+            "(default: %(default)s)"
+        ),
+    )
+
+    ingest = subparsers.add_parser("ingest", help=run_ingest.__doc__)
+    ingest.add_argument(
+        "--base-url",
+        default="https://zenodo.org",
+        help="Base URL from which to download (default: %(default)s)",
+    )
+    ingest.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Directory in which to cache downloads (default: pooch's cache)",
+    )
+    ingest.add_argument(
+        "--n-workers",
+        type=int,
+        default=None,
+        help="Number of downloads to run at once (default: one per archive)",
+    )
+    ingest.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-process all archives, even if their outputs are up to date",
+    )
+    ingest.set_defaults(func=run_ingest)
+
+    catalogue = subparsers.add_parser(
+        "catalogue", parents=[files], help=run_catalogue.__doc__
+    )
+    catalogue.set_defaults(func=run_catalogue)
+
+    load = subparsers.add_parser(
+        "load", parents=[files, variables, workers], help=run_load.__doc__
+    )
+    load.set_defaults(func=run_load)
+
+    summary = subparsers.add_parser(
+        "summary", parents=[variables, source_ids], help=run_summary.__doc__
+    )
+    summary.add_argument(
+        "--erf-threshold",
+        type=float,
+        default=0.01,
+        help="ERF difference (W / m^2) above which to flag a gas "
+        "(default: %(default)s)",
+    )
+    summary.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with a non-zero code if any gas is flagged",
+    )
+    summary.add_argument("--csv", action="store_true", help="Write CSV to stdout")
+    summary.set_defaults(func=run_summary)
+
+    plots = subparsers.add_parser(
+        "plots", parents=[variables, source_ids, workers], help=run_plots.__doc__
+    )
+    plots.add_argument(
+        "--out-dir",
+        type=Path,
+        default=FIGURES_DIR,
+        help="Directory in which to write the figures (default: %(default)s)",
+    )
+    plots.add_argument(
+        "--force",
+        action="store_true",
+        help="Render all figures, even if their inputs haven't changed",
+    )
+    plots.set_defaults(func=run_plots)
+
+    projections = subparsers.add_parser("projections", help=run_projections.__doc__)
+    for name, help_name in (
+        ("source", "Source"),
+        ("scenario", "Scenario"),
+        ("species", "Species"),
+        ("variable", "Variable"),
+    ):
+        projections.add_argument(
+            f"--{name}",
+            action="append",
+            default=[],
+            help=f"{help_name} to include (repeat for more). Default: all.",
+        )
+    projections.add_argument(
+        "--start-year",
+        type=int,
+        default=1,
+        help="First year to include (default: %(default)s)",
+    )
+    projections.add_argument(
+        "--end-year",
+        type=int,
+        default=2500,
+        help="Last year to include (default: %(default)s)",
+    )
+    projections.add_argument("--csv", action="store_true", help="Write CSV to stdout")
+    projections.set_defaults(func=run_projections)
+
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """
+    Run the command-line interface
+    """
+    args = get_parser().parse_args(argv)
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
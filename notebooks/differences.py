@@ -0,0 +1,245 @@
+"""
+Differences between sources, for all gases at once
+
+All gases are stacked into a single (gas, source ID, year) array,
+so absolute, relative and ERF differences (and their maxima)
+are each computed with a single array operation,
+rather than gas by gas.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+import xarray as xr
+
+from radiative_efficiencies import get_data_units
+
+
+def stack_gases(
+    loaded: xr.Dataset, gases: Iterable[str], source_ids: Iterable[str]
+) -> xr.DataArray:
+    """
+    Stack gases into a single array
+
+    Parameters
+    ----------
+    loaded
+        Loaded data, with one variable per gas
+        and `source_id` and `year` dimensions
+
+    gases
+        Gases to stack
+
+    source_ids
+        Source IDs to stack
+
+    Returns
+    -------
+        Data with `gas`, `source_id` and `year` dimensions (in memory),
+        followed by any other dimensions (e.g. `region`)
+    """
+    return (
+        loaded[list(gases)]
+        .sel(source_id=list(source_ids))
+        .to_dataarray("gas")
+        .transpose("gas", "source_id", "year", ...)
+        .compute()
+    )
+
+
+def check_for_gaps(loaded: xr.Dataset, gases: Iterable[str], years: range) -> None:
+    """
+    Check that no source has gaps in a given period
+
+    Sources with no data at all for a gas are ignored.
+    If the data has other dimensions (e.g. `region`),
+    each of their values is checked separately.
+
+    Parameters
+    ----------
+    loaded
+        Loaded data, with one variable per gas
+        and `source_id` and `year` dimensions
+
+    gases
+        Gases to check
+
+    years
+        Period in which there should be no gaps
+
+    Raises
+    ------
+    AssertionError
+        Any source has gaps in `years` for any gas
+        (which is most likely the result of a renaming error)
+    """
+    stacked = loaded[list(gases)].to_dataarray("gas")
+    has_data = stacked.notnull().any("year")
+    has_gap = stacked.sel(year=years).isnull().any("year")
+
+    gases_with_gaps = stacked["gas"].values[
+        (has_data & has_gap)
+        .any([dim for dim in has_gap.dims if dim != "gas"])
+        .compute()
+        .values
+    ]
+    if gases_with_gaps.size > 0:
+        msg = f"Likely renaming error for {gases_with_gaps.tolist()}"
+        raise AssertionError(msg)
+
+
+def check_units(loaded: xr.Dataset, expected_units: Mapping[str, str]) -> None:
+    """
+    Check that each gas' data is in the units we expect
+
+    Parameters
+    ----------
+    loaded
+        Loaded data, with one variable per gas
+
+    expected_units
+        Units we expect each gas' data to be in
+
+    Raises
+    ------
+    AssertionError
+        Any gas' data isn't in the units we expect
+        (e.g. radiative efficiencies were converted for different data)
+    """
+    data_units = get_data_units(loaded, expected_units)
+    mismatches = {
+        gas: (units, data_units[gas])
+        for gas, units in expected_units.items()
+        if data_units[gas] != units
+    }
+    if mismatches:
+        msg = f"Units mismatch (expected, data) for {mismatches}"
+        raise AssertionError(msg)
+
+
+def compute_differences(
+    loaded: xr.Dataset,
+    compare_source_id: str,
+    base_source_id: str,
+    radiative_efficiencies: Mapping[str, float],
+    radiative_efficiency_units: Mapping[str, str],
+    gases: Iterable[str] | None = None,
+) -> xr.Dataset:
+    """
+    Compute the differences between two sources for all gases at once
+
+    Parameters
+    ----------
+    loaded
+        Loaded data, with one variable per gas
+        and `source_id` and `year` dimensions
+
+    compare_source_id
+        Source ID to compare
+
+    base_source_id
+        Source ID to compare against
+
+    radiative_efficiencies
+        Radiative efficiency of each gas,
+        as plain numbers in W / m^2 per unit of the gas' data in `loaded`
+        (e.g. W / m^2 / ppm for CO2 if CO2 concentrations are in ppm).
+        Converting the units once up front means
+        we don't have to carry units through the calculation.
+        Gases without a radiative efficiency get NaN ERF differences.
+
+    radiative_efficiency_units
+        Units of each gas' data for which `radiative_efficiencies` were converted
+        (i.e. the `data_units` passed to
+        `radiative_efficiencies.get_radiative_efficiencies`).
+        These are checked against the units of the data in `loaded`
+        before the radiative efficiencies are applied.
+
+    gases
+        Gases to compare.
+        If not supplied, all variables in `loaded` except bounds variables.
+
+    Returns
+    -------
+        Differences, with variables:
+
+        - `absolute`: `compare_source_id` minus `base_source_id`
+        - `relative`: absolute difference as a percentage of `compare_source_id`
+        - `erf`: effective radiative forcing of the absolute difference (W / m^2)
+        - `radiative_efficiency`: radiative efficiency used for each gas
+        - `absolute_max`, `relative_max` and `erf_max`:
+          maximum magnitude of each difference over all years
+
+        If `loaded` has other dimensions (e.g. `region`),
+        these are kept in all the outputs.
+
+    Raises
+    ------
+    AssertionError
+        The units of any gas with a radiative efficiency
+        don't match `radiative_efficiency_units` (see `check_units`)
+    """
+    if gases is None:
+        gases = [v for v in loaded.data_vars if "bnds" not in v]
+
+    gases = sorted(gases)
+    check_units(
+        loaded,
+        {
+            gas: radiative_efficiency_units.get(gas)
+            for gas in gases
+            if gas in radiative_efficiencies
+        },
+    )
+    stacked = stack_gases(loaded, gases, [compare_source_id, base_source_id])
+    compare = stacked.sel(source_id=compare_source_id, drop=True)
+    base = stacked.sel(source_id=base_source_id, drop=True)
+
+    rad_eff = xr.DataArray(
+        np.array([radiative_efficiencies.get(gas, np.nan) for gas in gases]),
+        dims="gas",
+        coords={"gas": gases},
+    )
+
+    absolute = compare - base
+    out = xr.Dataset(
+        {
+            "absolute": absolute,
+            "relative": absolute / compare * 100,
+            "erf": absolute * rad_eff,
+            "radiative_efficiency": rad_eff,
+        }
+    )
+    for name in ("absolute", "relative", "erf"):
+        out[f"{name}_max"] = np.abs(out[name]).max("year")
+
+    out["erf"].attrs["units"] = "W / m^2"
+    out["erf_max"].attrs["units"] = "W / m^2"
+    out["relative"].attrs["units"] = "%"
+    out["relative_max"].attrs["units"] = "%"
+
+    return out
+
+
+def get_gas_difference(differences: xr.Dataset, kind: str, gas: str) -> xr.DataArray:
+    """
+    Get a single gas' difference of a given kind
+
+    Parameters
+    ----------
+    differences
+        Output of `compute_differences`
+
+    kind
+        Kind of difference (e.g. `"absolute"`)
+
+    gas
+        Gas for which to get the difference
+
+    Returns
+    -------
+        Difference, named after `gas` (ready for plotting)
+    """
+    return differences[kind].sel(gas=gas, drop=True).rename(gas)
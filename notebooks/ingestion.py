@@ -0,0 +1,477 @@
+"""
+Ingestion of reference data from Zenodo
+
+Each archive is described by a `ZenodoArchive`.
+`ingest_archives` downloads all the archives concurrently
+and parses each one as soon as its download finishes.
+Downloads are verified against the archive's known hash
+and only the members we need are unzipped.
+Outputs are only re-parsed if their inputs (or the parser) have changed
+(see `build_manifest`).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+import pooch
+
+from build_manifest import is_up_to_date, record_build
+from utils import INTERIM_DATA_DIR, PROCESSED_DATA_DIR
+from workbooks import read_sheet_values, split_blocks
+
+WORKBOOK_CACHE_DIR = INTERIM_DATA_DIR / "workbook-cache"
+"""Directory in which to cache the values read from Excel workbooks"""
+
+ZENODO_BASE_URL = "https://zenodo.org"
+"""
+Base URL from which to download archives
+
+Can be overridden, e.g. to point at a local HTTP server for offline testing.
+"""
+
+
+@dataclass(frozen=True)
+class ZenodoArchive:
+    """
+    Specification of a reference data archive on Zenodo
+    """
+
+    name: str
+    """Name of the archive (also the directory of its processed output)"""
+
+    url_path: str
+    """Path of the archive, relative to the base URL"""
+
+    known_hash: str
+    """Known SHA256 hash of the archive"""
+
+    members: tuple[str, ...]
+    """Members of the archive to unzip"""
+
+    parse: Callable[[list[Path]], pd.DataFrame]
+    """Function which parses the unzipped members into the processed output"""
+
+    out_filename: str
+    """Name of the processed output file"""
+
+    parser_version: str = "1"
+    """
+    Version of `parse`
+
+    Bump this whenever `parse` changes in a way which changes its output.
+    This triggers re-parsing, even if the archive hasn't changed.
+    """
+
+    @property
+    def fname(self) -> str:
+        """
+        Name of the archive in the download cache
+        """
+        return f"{self.name}.zip"
+
+    def get_url(self, base_url: str = ZENODO_BASE_URL) -> str:
+        """
+        Get the URL from which to download the archive
+        """
+        return f"{base_url.rstrip('/')}/{self.url_path}"
+
+    def get_out_file(self, processed_data_dir: Path = PROCESSED_DATA_DIR) -> Path:
+        """
+        Get the path to which to write the processed output
+        """
+        return Path(processed_data_dir) / self.name / self.out_filename
+
+
+def parse_western_et_al_2024(files: list[Path]) -> pd.DataFrame:
+    """
+    Parse the Western et al., 2024 HCFC projections
+    """
+    if len(files) != 1:
+        raise AssertionError(files)
+
+    return pd.read_csv(files[0], skiprows=1)
+
+
+VELDERS_SPECIES = (
+    "HFC-32",
+    "HFC-125",
+    "HFC-134a",
+    "HFC-143a",
+    "HFC-152a",
+    "HFC-227ea",
+    "HFC-236fa",
+    "HFC-245fa",
+    "HFC-365mfc",
+    "HFC-43-10mee",
+)
+"""Species in each of Velders et al., 2022's scenario sheets"""
+
+
+def read_velders_sheet(file: Path, sheet_name: str) -> list[pd.DataFrame]:
+    """
+    Read the per-species blocks of one of Velders et al., 2022's scenario sheets
+
+    Parameters
+    ----------
+    file
+        Scenario workbook
+
+    sheet_name
+        Sheet to read (e.g. "Upper" or "Lower")
+
+    Returns
+    -------
+        One block per species (see `workbooks.split_blocks`)
+    """
+    blocks = split_blocks(
+        read_sheet_values(file, sheet_name, cache_dir=WORKBOOK_CACHE_DIR),
+        header_marker="Species",
+        value_columns=["Year", "Mix_tot"],
+    )
+
+    species = [block["Species"].unique() for block in blocks]
+    if any(len(v) != 1 for v in species) or {v[0] for v in species} != set(
+        VELDERS_SPECIES
+    ):
+        raise AssertionError(species)
+
+    return blocks
+
+
+def parse_velders_et_al_2022(files: list[Path]) -> pd.DataFrame:
+    """
+    Parse the historical data from Velders et al., 2022's HFC scenarios
+    """
+    if len(files) != 1:
+        raise AssertionError(files)
+
+    # Doesn't matter whether we use upper or lower as we're just getting historical data
+    clean_l = []
+    for block in read_velders_sheet(files[0], sheet_name="Upper"):
+        gas = block["Species"].iloc[0]
+        keep = block[["Year", "Mix_tot"]].rename(
+            {"Year": "year", "Mix_tot": gas}, axis="columns"
+        )
+        keep = keep[keep["year"] < 2025]
+        keep = keep.set_index("year")
+
+        clean_l.append(keep)
+
+    return pd.concat(clean_l, axis="columns").reset_index()
+
+
+def parse_year_month(
+    dates: pd.Series, date_format: str | None = None
+) -> tuple[pd.Series, pd.Series]:
+    """
+    Parse the year and month of dates, without any per-row Python
+
+    High-frequency records from many stations share most of their dates,
+    so only the unique dates are parsed,
+    then the results are broadcast back to every row.
+
+    Parameters
+    ----------
+    dates
+        Dates to parse
+
+    date_format
+        Format of the dates (see `pd.to_datetime`).
+        If not supplied, dates are assumed to be "day/month/year"
+        and are split as strings.
+
+    Returns
+    -------
+        Year and month of each date
+    """
+    codes, uniques = pd.factorize(dates)
+    if (codes < 0).any():
+        msg = "Missing dates"
+        raise ValueError(msg)
+
+    uniques = pd.Series(uniques)
+    if date_format is not None:
+        parsed = pd.to_datetime(uniques, format=date_format)
+        unique_years, unique_months = parsed.dt.year, parsed.dt.month
+
+    else:
+        parts = uniques.str.split("/", expand=True)
+        unique_years, unique_months = parts.iloc[:, -1], parts.iloc[:, 1]
+
+    return (
+        pd.Series(unique_years.astype(int).to_numpy()[codes], index=dates.index),
+        pd.Series(unique_months.astype(int).to_numpy()[codes], index=dates.index),
+    )
+
+
+def compute_station_annual_means(
+    records: pd.DataFrame, gases: list[str]
+) -> pd.DataFrame:
+    """
+    Compute annual-means of station records, for all stations at once
+
+    The records can be at any frequency (e.g. monthly, daily or in-situ).
+    All stations are reduced with a single grouped mean.
+
+    Parameters
+    ----------
+    records
+        Records, with `station` and `year` columns and one column per gas.
+        If `station` is categorical, the output is in the order of its categories,
+        otherwise stations are sorted.
+
+    gases
+        Gases for which to compute annual-means
+
+    Returns
+    -------
+        Annual-means, with `station`, `year`, `gas` and `value` columns
+        (sorted by station, year then gas in the order of `gases`).
+        Years without any data for a gas are dropped.
+    """
+    annual_mean = records.groupby(["station", "year"], observed=True)[gases].mean()
+    annual_mean.columns.name = "gas"
+
+    return annual_mean.stack().to_frame("value").reset_index()
+
+
+DROSTE_STATIONS = {
+    "best-fits_CG": ("Cape Grim", -40.6833),
+    "best-fits_TAC": ("Talconeston", 52.5127),
+}
+"""Station name and latitude for each Droste et al., 2020 file prefix"""
+
+DROSTE_VARIABLE_MAP = {
+    "cC4F8": "cc4f8",
+    "nC4F10": "c4f10",
+    "nC5F12": "c5f12",
+    # "iC6F14": "ic6f14",  # not using for now
+    "nC6F14": "c6f14",
+    "nC7F16": "c7f16",
+}
+"""Map from Droste et al., 2020's column names to normalised variable names"""
+
+
+def parse_droste_et_al_2020(files: list[Path]) -> pd.DataFrame:
+    """
+    Parse Droste et al., 2020's PFC observations into annual-means
+    """
+    stations = []
+    raw_l = []
+    for file in files:
+        file = Path(file)
+        for prefix, (station, _) in DROSTE_STATIONS.items():
+            if file.name.startswith(prefix):
+                break
+        else:
+            raise NotImplementedError(file)
+
+        raw = pd.read_csv(file, usecols=["Date", *DROSTE_VARIABLE_MAP])
+        raw["station"] = station
+        stations.append(station)
+        raw_l.append(raw)
+
+    records = pd.concat(raw_l, ignore_index=True).rename(
+        DROSTE_VARIABLE_MAP, axis="columns"
+    )
+    records["station"] = pd.Categorical(records["station"], categories=stations)
+    records["year"], records["month"] = parse_year_month(records["Date"])
+
+    out = compute_station_annual_means(records, list(DROSTE_VARIABLE_MAP.values()))
+    out["station"] = out["station"].astype(str)
+    out["unit"] = "ppt"
+    out["lat"] = out["station"].map(
+        {station: lat for station, lat in DROSTE_STATIONS.values()}
+    )
+
+    return out[["year", "gas", "value", "unit", "lat", "station"]]
+
+
+WESTERN_ARCHIVE = ZenodoArchive(
+    name="western-et-al-2024",
+    url_path="records/10782689/files/Projections.zip?download=1",
+    known_hash="10ffeebdcfd362186ce64abb1dc1710e3ebf4d6b41bf18faf2bb7ff45a82b2f7",
+    members=("Projections/hcfc_projections_v2.csv",),
+    parse=parse_western_et_al_2024,
+    out_filename="hcfc_projections.csv",
+)
+
+VELDERS_ARCHIVE = ZenodoArchive(
+    name="velders-et-al-2022",
+    url_path=(
+        "records/6520707/files/veldersguus/HFC-scenarios-2022-v1.0.zip?download=1"
+    ),
+    known_hash="74fe066fac06b742ba4fec6ad3af52a595f81a2a1c69d53a8eaf9ca846b3a7cd",
+    members=(
+        "veldersguus-HFC-scenarios-2022-859d44c/HFC_Current_Policy_2022_Scenario.xlsx",
+    ),
+    parse=parse_velders_et_al_2022,
+    out_filename="hfc_projections.csv",
+)
+
+DROSTE_ARCHIVE = ZenodoArchive(
+    name="droste-et-al-2020",
+    url_path=(
+        "records/3519317/files/"
+        "Trends-Emission_PFCs_Droste-etal_ACP_20191025.zip?download=1"
+    ),
+    known_hash="f71fda6b8848f627b7736870241bfa075d941bcd458fff6105287e951aed6c21",
+    members=("best-fits_CG_PFCs.csv", "best-fits_TAC_PFCs.csv"),
+    parse=parse_droste_et_al_2020,
+    out_filename="pfcs_data.csv",
+)
+
+ZENODO_ARCHIVES = (WESTERN_ARCHIVE, VELDERS_ARCHIVE, DROSTE_ARCHIVE)
+"""All the reference data archives we get from Zenodo"""
+
+
+def retrieve_archive(
+    archive: ZenodoArchive,
+    base_url: str = ZENODO_BASE_URL,
+    cache_dir: Path | None = None,
+) -> list[Path]:
+    """
+    Retrieve an archive, unzipping the members we need
+
+    Parameters
+    ----------
+    archive
+        Archive to retrieve
+
+    base_url
+        Base URL from which to download
+
+    cache_dir
+        Directory in which to cache downloads.
+        If not supplied, pooch's default cache is used.
+        If the archive is already in the cache (and matches its known hash),
+        nothing is downloaded.
+
+    Returns
+    -------
+        Paths to the unzipped members, in the order of `archive.members`
+    """
+    unzipped = pooch.retrieve(
+        archive.get_url(base_url),
+        known_hash=archive.known_hash,
+        fname=archive.fname,
+        path=cache_dir,
+        processor=pooch.Unzip(members=list(archive.members)),
+    )
+    by_member = {Path(p).as_posix(): Path(p) for p in unzipped}
+
+    return [
+        next(p for k, p in by_member.items() if k.endswith(member))
+        for member in archive.members
+    ]
+
+
+def ingest_archive(
+    archive: ZenodoArchive,
+    base_url: str = ZENODO_BASE_URL,
+    cache_dir: Path | None = None,
+    processed_data_dir: Path = PROCESSED_DATA_DIR,
+    force: bool = False,
+) -> Path:
+    """
+    Retrieve and parse an archive, writing the processed output
+
+    If the processed output was already built from the same unzipped members
+    by the same version of the parser, parsing is skipped.
+
+    Parameters
+    ----------
+    archive
+        Archive to ingest
+
+    base_url
+        Base URL from which to download
+
+    cache_dir
+        Directory in which to cache downloads (see `retrieve_archive`)
+
+    processed_data_dir
+        Directory in which to write processed data
+
+    force
+        Parse and write the output, even if it is up to date
+
+    Returns
+    -------
+        Path to the processed output
+    """
+    inputs = retrieve_archive(archive, base_url, cache_dir)
+    out_file = archive.get_out_file(processed_data_dir)
+    if not force and is_up_to_date(out_file, inputs, archive.parser_version):
+        return out_file
+
+    clean = archive.parse(inputs)
+
+    out_file.parent.mkdir(exist_ok=True, parents=True)
+    clean.to_csv(out_file, index=False)
+    record_build(out_file, inputs, archive.parser_version)
+
+    return out_file
+
+
+def ingest_archives(
+    archives: Iterable[ZenodoArchive] = ZENODO_ARCHIVES,
+    base_url: str = ZENODO_BASE_URL,
+    cache_dir: Path | None = None,
+    processed_data_dir: Path = PROCESSED_DATA_DIR,
+    n_workers: int | None = None,
+    force: bool = False,
+) -> dict[str, Path]:
+    """
+    Ingest many archives concurrently
+
+    Downloading is I/O bound, so we use threads.
+    Each archive is parsed as soon as its own download finishes,
+    rather than waiting for all the downloads.
+
+    Parameters
+    ----------
+    archives
+        Archives to ingest
+
+    base_url
+        Base URL from which to download
+
+    cache_dir
+        Directory in which to cache downloads (see `retrieve_archive`)
+
+    processed_data_dir
+        Directory in which to write processed data
+
+    n_workers
+        Number of threads to use.
+        If not supplied, one per archive.
+
+    force
+        Parse and write all outputs, even if they are up to date
+
+    Returns
+    -------
+        Path to the processed output of each archive
+    """
+    archives = list(archives)
+    with ThreadPoolExecutor(max_workers=n_workers or max(len(archives), 1)) as executor:
+        futures = {
+            executor.submit(
+                ingest_archive,
+                archive,
+                base_url=base_url,
+                cache_dir=cache_dir,
+                processed_data_dir=processed_data_dir,
+                force=force,
+            ): archive.name
+            for archive in archives
+        }
+        out = {futures[future]: future.result() for future in as_completed(futures)}
+
+    return {archive.name: out[archive.name] for archive in archives}
@@ -0,0 +1,381 @@
+"""
+Loading of CMIP data
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from cf_time import assign_year_month_coords
+
+CMIP6_TO_CMIP7_VARIABLE_MAP = {
+    "mole_fraction_of_carbon_dioxide_in_air": "co2",
+    "mole_fraction_of_methane_in_air": "ch4",
+    "mole_fraction_of_nitrous_oxide_in_air": "n2o",
+    "mole_fraction_of_c2f6_in_air": "c2f6",
+    "mole_fraction_of_c3f8_in_air": "c3f8",
+    "mole_fraction_of_c4f10_in_air": "c4f10",
+    "mole_fraction_of_c5f12_in_air": "c5f12",
+    "mole_fraction_of_c6f14_in_air": "c6f14",
+    "mole_fraction_of_c7f16_in_air": "c7f16",
+    "mole_fraction_of_c8f18_in_air": "c8f18",
+    "mole_fraction_of_c_c4f8_in_air": "cc4f8",
+    "mole_fraction_of_carbon_tetrachloride_in_air": "ccl4",
+    "mole_fraction_of_cf4_in_air": "cf4",
+    "mole_fraction_of_cfc11_in_air": "cfc11",
+    "mole_fraction_of_cfc113_in_air": "cfc113",
+    "mole_fraction_of_cfc114_in_air": "cfc114",
+    "mole_fraction_of_cfc115_in_air": "cfc115",
+    "mole_fraction_of_cfc12_in_air": "cfc12",
+    "mole_fraction_of_ch2cl2_in_air": "ch2cl2",
+    "mole_fraction_of_methyl_bromide_in_air": "ch3br",
+    "mole_fraction_of_ch3ccl3_in_air": "ch3ccl3",
+    "mole_fraction_of_methyl_chloride_in_air": "ch3cl",
+    "mole_fraction_of_chcl3_in_air": "chcl3",
+    "mole_fraction_of_halon1211_in_air": "halon1211",
+    "mole_fraction_of_halon1301_in_air": "halon1301",
+    "mole_fraction_of_halon2402_in_air": "halon2402",
+    "mole_fraction_of_hcfc141b_in_air": "hcfc141b",
+    "mole_fraction_of_hcfc142b_in_air": "hcfc142b",
+    "mole_fraction_of_hcfc22_in_air": "hcfc22",
+    "mole_fraction_of_hfc125_in_air": "hfc125",
+    "mole_fraction_of_hfc134a_in_air": "hfc134a",
+    "mole_fraction_of_hfc143a_in_air": "hfc143a",
+    "mole_fraction_of_hfc152a_in_air": "hfc152a",
+    "mole_fraction_of_hfc227ea_in_air": "hfc227ea",
+    "mole_fraction_of_hfc23_in_air": "hfc23",
+    "mole_fraction_of_hfc236fa_in_air": "hfc236fa",
+    "mole_fraction_of_hfc245fa_in_air": "hfc245fa",
+    "mole_fraction_of_hfc32_in_air": "hfc32",
+    "mole_fraction_of_hfc365mfc_in_air": "hfc365mfc",
+    "mole_fraction_of_hfc4310mee_in_air": "hfc4310mee",
+    "mole_fraction_of_nf3_in_air": "nf3",
+    "mole_fraction_of_sf6_in_air": "sf6",
+    "mole_fraction_of_so2f2_in_air": "so2f2",
+    "mole_fraction_of_cfc11eq_in_air": "cfc11eq",
+    "mole_fraction_of_cfc12eq_in_air": "cfc12eq",
+    "mole_fraction_of_hfc134aeq_in_air": "hfc134aeq",
+}
+
+CMIP7_TO_NORMAL_VARIABLE_MAP = {
+    "co2": "co2",
+    "ch4": "ch4",
+    "n2o": "n2o",
+    "pfc116": "c2f6",
+    "pfc218": "c3f8",
+    "pfc3110": "c4f10",
+    "pfc4112": "c5f12",
+    "pfc5114": "c6f14",
+    "pfc6116": "c7f16",
+    "pfc7118": "c8f18",
+    "pfc318": "cc4f8",
+    "ccl4": "ccl4",
+    "cf4": "cf4",
+    "cfc11": "cfc11",
+    "cfc113": "cfc113",
+    "cfc114": "cfc114",
+    "cfc115": "cfc115",
+    "cfc12": "cfc12",
+    "ch2cl2": "ch2cl2",
+    "ch3br": "ch3br",
+    "hcc140a": "ch3ccl3",
+    "ch3cl": "ch3cl",
+    "chcl3": "chcl3",
+    "halon1211": "halon1211",
+    "halon1301": "halon1301",
+    "halon2402": "halon2402",
+    "hcfc141b": "hcfc141b",
+    "hcfc142b": "hcfc142b",
+    "hcfc22": "hcfc22",
+    "hfc125": "hfc125",
+    "hfc134a": "hfc134a",
+    "hfc143a": "hfc143a",
+    "hfc152a": "hfc152a",
+    "hfc227ea": "hfc227ea",
+    "hfc23": "hfc23",
+    "hfc236fa": "hfc236fa",
+    "hfc245fa": "hfc245fa",
+    "hfc32": "hfc32",
+    "hfc365mfc": "hfc365mfc",
+    "hfc4310mee": "hfc4310mee",
+    "nf3": "nf3",
+    "sf6": "sf6",
+    "so2f2": "so2f2",
+    "cfc11eq": "cfc11eq",
+    "cfc12eq": "cfc12eq",
+    "hfc134aeq": "hfc134aeq",
+}
+
+
+def normalise_variable_names(v: str) -> str:
+    if v in CMIP6_TO_CMIP7_VARIABLE_MAP:
+        return CMIP6_TO_CMIP7_VARIABLE_MAP[v]
+
+    if v in CMIP7_TO_NORMAL_VARIABLE_MAP:
+        return CMIP7_TO_NORMAL_VARIABLE_MAP[v]
+
+    return v
+
+
+def fix_cmip6_time_axis(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Fix the time axis of CMIP6 data
+
+    The first year is dropped (it is zero and doesn't exist anywhere)
+    and units of "days since 0-1-1" (which aren't valid CF) are fixed.
+
+    Parameters
+    ----------
+    ds
+        CMIP6 data, loaded with `decode_times=False`
+
+    Returns
+    -------
+        Data with a fixed (still encoded) time axis
+    """
+    if ds.attrs["frequency"] == "yr":
+        out = ds.isel(time=slice(1, None))
+
+    else:
+        out = ds.isel(time=slice(12, None))
+
+    if out["time"].attrs["units"] == "days since 0-1-1":
+        out["time"].attrs["units"] = "days since 0001-1-1"
+        old_attrs = out["time"].attrs
+        out["time"] = out["time"] - 365
+        out["time"].attrs = old_attrs
+
+    return out
+
+
+def select_cmip6_global_mean(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Select the global-mean sector of CMIP6 data
+    """
+    return ds.sel(sector=0).reset_coords("sector", drop=True)
+
+
+def load_cmip6_data(
+    fps: list[Path], lazy: bool = False, fast_time: bool = False
+) -> xr.Dataset:
+    """
+    Load CMIP6 data
+
+    Only the global-mean is returned.
+
+    Parameters
+    ----------
+    fps
+        Files to load
+
+    lazy
+        If `True`, the sector selection, time trimming and renaming
+        are applied before any data is read,
+        so only the global-mean data is ever read into memory
+        (and only variables which vary along time are concatenated across files).
+        Otherwise, all the data (every sector) is read first
+        and the global-mean is selected at the end.
+
+    fast_time
+        If `True`, the time axis is not decoded to cftime objects.
+        Instead, integer `year` and `month` co-ordinates are added
+        along the time dimension (see `cf_time.assign_year_month_coords`).
+        This is much faster,
+        but only useful if all you need downstream is years and months.
+
+    Returns
+    -------
+        Loaded, global-mean data
+    """
+    if lazy:
+        # Only concatenate what varies along time
+        # and select the global-mean before anything is read
+        out = xr.open_mfdataset(fps, decode_times=False, data_vars="minimal")
+        out = select_cmip6_global_mean(out)
+
+    else:
+        # Same as we have always done: read everything,
+        # only selecting the global-mean at the end
+        out = xr.open_mfdataset(fps, decode_times=False).compute()
+
+    out = fix_cmip6_time_axis(out)
+
+    if fast_time:
+        out = assign_year_month_coords(out)
+    else:
+        out = xr.decode_cf(out, decode_times=True, use_cftime=True)
+
+    out = out.rename(
+        {k: v for k, v in CMIP6_TO_CMIP7_VARIABLE_MAP.items() if k in out.data_vars}
+    )
+
+    if lazy:
+        out = out.compute()
+
+    else:
+        out = select_cmip6_global_mean(out)
+
+    return out
+
+
+def load_cmip7_data(
+    fps: list[Path], lazy: bool = False, fast_time: bool = False
+) -> xr.Dataset:
+    """
+    Load CMIP7 data
+
+    Parameters
+    ----------
+    fps
+        Files to load
+
+    lazy
+        If `True`, renaming is applied before any data is read
+        (and only variables which vary along time are concatenated across files).
+        Otherwise, all the data is read first.
+
+    fast_time
+        If `True`, the time axis is not decoded to cftime objects,
+        see `load_cmip6_data`.
+
+    Returns
+    -------
+        Loaded data
+    """
+    open_kwargs = dict(decode_times=False) if fast_time else dict(use_cftime=True)
+    if lazy:
+        # Only concatenate what varies along time
+        out = xr.open_mfdataset(fps, data_vars="minimal", **open_kwargs)
+
+    else:
+        out = xr.open_mfdataset(fps, **open_kwargs).compute()
+
+    if fast_time:
+        out = assign_year_month_coords(out)
+
+    out = out.rename(
+        {k: v for k, v in CMIP7_TO_NORMAL_VARIABLE_MAP.items() if k in out.data_vars}
+    )
+
+    if lazy:
+        out = out.compute()
+
+    return out
+
+
+def annual_mean(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Calculate annual-means
+
+    This gives the same result as `ds.groupby("year").mean()`,
+    but avoids xarray's generic groupby machinery.
+    Instead, we do a segmented reduction (`np.add.reduceat`)
+    over the runs of timesteps which share the same year.
+
+    Parameters
+    ----------
+    ds
+        Data of which to calculate the annual-mean.
+        Must have an integer `year` co-ordinate along its `time` dimension
+        (e.g. from `cf_time.assign_year_month_coords`).
+        Other co-ordinates along the `time` dimension are dropped.
+        Variables without a `time` dimension are returned unchanged.
+
+    Returns
+    -------
+        Annual-mean data, on a `year` dimension
+    """
+    year = ds["year"].values
+    if (np.diff(year) < 0).any():
+        ds = ds.isel(time=np.argsort(year, kind="stable"))
+        year = ds["year"].values
+
+    starts = np.flatnonzero(np.concatenate([[True], year[1:] != year[:-1]]))
+
+    data_vars = {}
+    for name, da in ds.data_vars.items():
+        if "time" not in da.dims:
+            data_vars[name] = da
+            continue
+
+        axis = da.get_axis_num("time")
+        values = da.values
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype(np.float64)
+
+        valid = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=axis)
+        counts = np.add.reduceat(valid.astype(np.int64), starts, axis=axis)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (sums / counts).astype(values.dtype, copy=False)
+
+        data_vars[name] = (
+            tuple("year" if dim == "time" else dim for dim in da.dims),
+            means,
+            da.attrs,
+        )
+
+    coords = {
+        name: coord for name, coord in ds.coords.items() if "time" not in coord.dims
+    }
+    coords["year"] = year[starts]
+
+    return xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+
+
+def load_annual_mean(
+    source_id: str, fps: list[Path], fast_time: bool = True
+) -> xr.Dataset:
+    """
+    Load data and normalise it to annual-means
+
+    Parameters
+    ----------
+    source_id
+        Source ID of the data
+
+    fps
+        Files to load
+
+    fast_time
+        Calculate annual-means with `annual_mean`,
+        using integer years decoded with NumPy,
+        rather than decoding to cftime, converting calendars
+        and using xarray's groupby (see `load_cmip6_data`).
+        The result is only the same either way for calendars
+        whose dates all exist in the proleptic_gregorian calendar
+        (e.g. standard, proleptic_gregorian, noleap).
+        For other calendars (e.g. 360_day), the slow path raises
+        or drops dates which don't exist in proleptic_gregorian,
+        whereas the fast path averages all the data in each year.
+
+    Returns
+    -------
+        Annual-mean data on a `year` dimension,
+        with a scalar `source_id` co-ordinate.
+        Bounds variables are dropped.
+    """
+    if "UoM" in source_id:
+        out = load_cmip6_data(fps, lazy=True, fast_time=fast_time)
+
+    else:
+        out = load_cmip7_data(fps, lazy=True, fast_time=fast_time)
+
+    out = out.drop_vars([v for v in out.data_vars if "bnds" in v])
+
+    if fast_time:
+        # We skip converting calendars and go straight to the annual mean.
+        # Same result as the slow path if all dates map to proleptic_gregorian.
+        out = annual_mean(out)
+
+    else:
+        # Make life easy, put everything on the same calendar
+        out = out.convert_calendar("proleptic_gregorian")
+        # Make life easy, take annual mean
+        out = out.groupby("time.year").mean()
+    out = out.assign_coords(source_id=source_id)
+
+    return out
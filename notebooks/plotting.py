@@ -0,0 +1,97 @@
+"""
+Preparation of data for plotting
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from reference_data import get_reference_data
+
+
+def build_comparison_frame(
+    loaded: xr.Dataset, reference_store: pd.DataFrame, gas: str
+) -> pd.DataFrame:
+    """
+    Build the frame which compares CMIP and reference data for a gas
+
+    Parameters
+    ----------
+    loaded
+        Loaded CMIP data
+
+    reference_store
+        Reference data (see `reference_data.build_reference_store`)
+
+    gas
+        Gas for which to build the frame
+
+    Returns
+    -------
+        Frame with `year`, `source` and `gas` columns, sorted by year.
+        `source` is categorical, with categories in the order
+        in which they appear in the CMIP data then the reference data
+        (so plot styling doesn't depend on the sort).
+    """
+    cmip_data = (
+        loaded[gas]
+        .to_dataframe()
+        .reset_index()
+        .rename({"source_id": "source"}, axis="columns")[["year", "source", gas]]
+    )
+
+    # Concatenating empty frames (gases without reference data) is deprecated
+    frames = [cmip_data, get_reference_data(reference_store, gas)]
+    out = pd.concat([frame for frame in frames if not frame.empty], ignore_index=True)
+    out["source"] = pd.Categorical(
+        out["source"].astype(str), categories=out["source"].astype(str).unique()
+    )
+
+    return out.sort_values("year", kind="stable", ignore_index=True)
+
+
+def build_comparison_frames(
+    loaded: xr.Dataset, reference_store: pd.DataFrame, gases: Iterable[str]
+) -> dict[str, pd.DataFrame]:
+    """
+    Build comparison frames for many gases
+
+    See `build_comparison_frame`.
+    The frames are built once and can then be re-used
+    for any number of time windows (see `select_years`).
+    """
+    return {gas: build_comparison_frame(loaded, reference_store, gas) for gas in gases}
+
+
+def select_years(frame: pd.DataFrame, time_range: range) -> pd.DataFrame:
+    """
+    Select the rows of a comparison frame which fall within a time range
+
+    Parameters
+    ----------
+    frame
+        Frame from which to select (see `build_comparison_frame`)
+
+    time_range
+        Years to select (must be contiguous, i.e. step of one)
+
+    Returns
+    -------
+        Rows of `frame` with a year in `time_range`.
+        Sources without any rows are dropped from the `source` categories.
+    """
+    if time_range.step != 1:
+        raise NotImplementedError(time_range)
+
+    years = frame["year"].to_numpy()
+    start = np.searchsorted(years, time_range.start, side="left")
+    stop = np.searchsorted(years, time_range.stop, side="left")
+
+    out = frame.iloc[start:stop].copy()
+    out["source"] = out["source"].cat.remove_unused_categories()
+
+    return out
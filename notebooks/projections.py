@@ -0,0 +1,331 @@
+"""
+Storage of and queries on reference projections, across all scenarios
+
+Every scenario, species and variable from the projection sources
+is stored in a single dataset, partitioned by source and scenario
+(one directory per partition, like a hive-partitioned Parquet dataset).
+Queries only read the partitions they need
+and each partition is only rebuilt if its inputs have changed,
+so comparing scenarios needs neither the full workbooks re-parsed
+nor every scenario in memory
+(see e.g. `python compare_ghg.py projections`).
+The dataset is written by `python compare_ghg.py ingest`
+and can always be regenerated, so isn't kept in git.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from build_manifest import is_up_to_date, record_build
+from ingestion import (
+    VELDERS_ARCHIVE,
+    WESTERN_ARCHIVE,
+    ZENODO_BASE_URL,
+    ZenodoArchive,
+    read_velders_sheet,
+    retrieve_archive,
+)
+from utils import PROCESSED_DATA_DIR
+
+PROJECTIONS_DIR = PROCESSED_DATA_DIR / "projections"
+"""Root directory of the projections dataset"""
+
+PARTITION_FILENAME = "data.csv"
+"""Name of the file which holds each partition's data"""
+
+COLUMNS = ["species", "variable", "year", "value"]
+"""Columns in each partition"""
+
+
+@dataclass(frozen=True)
+class ProjectionScenario:
+    """
+    Specification of a scenario from a projection source
+    """
+
+    source: str
+    """Source of the scenario"""
+
+    scenario: str
+    """Name of the scenario"""
+
+    archive: ZenodoArchive
+    """Archive which holds the scenario's data"""
+
+    parse: Callable[[list[Path]], pd.DataFrame]
+    """
+    Function which parses the archive's members into the scenario's data
+
+    The output must have the columns in `COLUMNS`.
+    """
+
+    parser_version: str = "1"
+    """
+    Version of `parse`
+
+    Bump this whenever `parse` changes in a way which changes its output.
+    """
+
+
+def parse_velders_scenario(files: list[Path], sheet_name: str) -> pd.DataFrame:
+    """
+    Parse every species and variable from one of Velders et al., 2022's sheets
+
+    Parameters
+    ----------
+    files
+        Unzipped archive members (the scenario workbook)
+
+    sheet_name
+        Sheet which holds the scenario
+
+    Returns
+    -------
+        Scenario data (see `COLUMNS`)
+    """
+    if len(files) != 1:
+        raise AssertionError(files)
+
+    out = pd.concat(
+        [
+            block.rename({"Species": "species", "Year": "year"}, axis="columns").melt(
+                id_vars=["species", "year"], var_name="variable", value_name="value"
+            )
+            for block in read_velders_sheet(files[0], sheet_name=sheet_name)
+        ],
+        ignore_index=True,
+    )
+    out["year"] = out["year"].astype(int)
+    out["value"] = pd.to_numeric(out["value"], errors="coerce")
+
+    return out.dropna(subset="value")[COLUMNS]
+
+
+def parse_western_projections(files: list[Path]) -> pd.DataFrame:
+    """
+    Parse Western et al., 2024's HCFC projections
+
+    Returns
+    -------
+        Scenario data (see `COLUMNS`)
+    """
+    if len(files) != 1:
+        raise AssertionError(files)
+
+    out = pd.read_csv(files[0], skiprows=1).melt(
+        id_vars="Year", var_name="species", value_name="value"
+    )
+    out = out.rename({"Year": "year"}, axis="columns")
+    out["variable"] = "mole_fraction"
+
+    return out.dropna(subset="value")[COLUMNS]
+
+
+PROJECTION_SCENARIOS = (
+    ProjectionScenario(
+        source=VELDERS_ARCHIVE.name,
+        scenario="current-policy-upper",
+        archive=VELDERS_ARCHIVE,
+        parse=partial(parse_velders_scenario, sheet_name="Upper"),
+    ),
+    ProjectionScenario(
+        source=VELDERS_ARCHIVE.name,
+        scenario="current-policy-lower",
+        archive=VELDERS_ARCHIVE,
+        parse=partial(parse_velders_scenario, sheet_name="Lower"),
+    ),
+    ProjectionScenario(
+        source=WESTERN_ARCHIVE.name,
+        scenario="hcfc-projections-v2",
+        archive=WESTERN_ARCHIVE,
+        parse=parse_western_projections,
+    ),
+)
+"""
+All the projection scenarios we store
+
+These are the scenarios in the archive members we already retrieve
+for the reference data (see `ingestion.ZenodoArchive.members`):
+both sheets of Velders et al., 2022's current-policy workbook
+and Western et al., 2024's HCFC projections.
+Any other files in the archives (e.g. further scenario workbooks)
+are intentionally left out, as nothing compares against them yet.
+To add a scenario, add its file to the archive's members
+and a `ProjectionScenario` for it here.
+"""
+
+
+def get_partition_path(root: Path, source: str, scenario: str) -> Path:
+    """
+    Get the path to a partition's data
+    """
+    return Path(root) / f"source={source}" / f"scenario={scenario}" / PARTITION_FILENAME
+
+
+def write_projections(
+    scenarios: Iterable[ProjectionScenario] = PROJECTION_SCENARIOS,
+    root: Path = PROJECTIONS_DIR,
+    base_url: str = ZENODO_BASE_URL,
+    cache_dir: Path | None = None,
+    force: bool = False,
+) -> list[Path]:
+    """
+    Write projection scenarios to the partitioned dataset
+
+    Partitions whose inputs and parser haven't changed are skipped
+    (see `build_manifest`).
+
+    Parameters
+    ----------
+    scenarios
+        Scenarios to write
+
+    root
+        Root directory of the dataset
+
+    base_url
+        Base URL from which to download archives
+
+    cache_dir
+        Directory in which to cache downloads
+        (see `ingestion.retrieve_archive`)
+
+    force
+        Write all partitions, even if they are up to date
+
+    Returns
+    -------
+        Paths to the partitions which were written (i.e. excluding skipped ones)
+    """
+    retrieved: dict[ZenodoArchive, list[Path]] = {}
+    written = []
+    for scenario in scenarios:
+        if scenario.archive not in retrieved:
+            retrieved[scenario.archive] = retrieve_archive(
+                scenario.archive, base_url, cache_dir
+            )
+
+        inputs = retrieved[scenario.archive]
+        out_file = get_partition_path(root, scenario.source, scenario.scenario)
+        if not force and is_up_to_date(out_file, inputs, scenario.parser_version):
+            continue
+
+        data = scenario.parse(inputs)
+
+        out_file.parent.mkdir(exist_ok=True, parents=True)
+        # Write then move so we never leave a half-written partition behind
+        tmp_file = out_file.with_suffix(".csv.tmp")
+        data.to_csv(tmp_file, index=False)
+        tmp_file.replace(out_file)
+        record_build(out_file, inputs, scenario.parser_version)
+        written.append(out_file)
+
+    return written
+
+
+def list_partitions(root: Path = PROJECTIONS_DIR) -> pd.DataFrame:
+    """
+    List the partitions in the dataset
+
+    Returns
+    -------
+        Source and scenario of each partition
+    """
+    partition_paths = sorted(
+        Path(root).glob(f"source=*/scenario=*/{PARTITION_FILENAME}")
+    )
+
+    return pd.DataFrame(
+        [
+            {
+                "source": fp.parents[1].name.removeprefix("source="),
+                "scenario": fp.parent.name.removeprefix("scenario="),
+            }
+            for fp in partition_paths
+        ],
+        columns=["source", "scenario"],
+    )
+
+
+def query_projections(
+    root: Path = PROJECTIONS_DIR,
+    source: str | Iterable[str] | None = None,
+    scenario: str | Iterable[str] | None = None,
+    species: str | Iterable[str] | None = None,
+    variable: str | Iterable[str] | None = None,
+    years: range | None = None,
+) -> pd.DataFrame:
+    """
+    Query the projections dataset
+
+    Only the partitions which match `source` and `scenario` are read.
+
+    Parameters
+    ----------
+    root
+        Root directory of the dataset
+
+    source
+        Source(s) to select. If not supplied, all sources.
+
+    scenario
+        Scenario(s) to select. If not supplied, all scenarios.
+
+    species
+        Species to select. If not supplied, all species.
+
+    variable
+        Variable(s) to select. If not supplied, all variables.
+
+    years
+        Years to select. If not supplied, all years.
+
+    Returns
+    -------
+        Selected data, with `source` and `scenario` columns
+        in addition to the columns in `COLUMNS`
+    """
+
+    def to_set(v: str | Iterable[str] | None) -> set[str] | None:
+        if v is None:
+            return None
+
+        return {v} if isinstance(v, str) else set(v)
+
+    sources, scenarios = to_set(source), to_set(scenario)
+    species, variables = to_set(species), to_set(variable)
+
+    partitions = list_partitions(root)
+    if sources is not None:
+        partitions = partitions[partitions["source"].isin(sources)]
+    if scenarios is not None:
+        partitions = partitions[partitions["scenario"].isin(scenarios)]
+
+    out_l = []
+    for partition_source, partition_scenario in partitions.itertuples(index=False):
+        data = pd.read_csv(
+            get_partition_path(root, partition_source, partition_scenario)
+        )
+        keep = pd.Series(True, index=data.index)
+        if species is not None:
+            keep &= data["species"].isin(species)
+        if variables is not None:
+            keep &= data["variable"].isin(variables)
+        if years is not None:
+            keep &= data["year"].isin(years)
+
+        data = data[keep]
+        data.insert(0, "scenario", partition_scenario)
+        data.insert(0, "source", partition_source)
+        out_l.append(data)
+
+    if not out_l:
+        return pd.DataFrame(columns=["source", "scenario", *COLUMNS])
+
+    return pd.concat(out_l, ignore_index=True)
@@ -0,0 +1,219 @@
+"""
+Radiative efficiencies, pre-converted to the units of the data
+
+The conversion to each gas' data units is done once,
+then cached to disk as plain numbers,
+so the difference analysis doesn't need a unit registry at all
+(pint and openscm_units are only imported for units we don't know about).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+
+import xarray as xr
+
+RADIATIVE_EFFICIENCIES_UNITS = "W / m^2 / ppb"
+"""Units of `RADIATIVE_EFFICIENCIES`"""
+
+# Table 7.SM.6 of https://www.ipcc.ch/report/ar6/wg1/downloads/report/IPCC_AR6_WGI_Chapter07_SM.pdf
+RADIATIVE_EFFICIENCIES: dict[str, float] = {
+    "co2": 1.33e-5,
+    "ch4": 0.000388,
+    "n2o": 0.0032,
+    # Chlorofluorocarbons
+    "cfc11": 0.291,
+    "cfc11eq": 0.291,
+    "cfc12": 0.358,
+    "cfc12eq": 0.358,
+    "cfc113": 0.301,
+    "cfc114": 0.314,
+    "cfc115": 0.246,
+    # Hydrofluorochlorocarbons
+    "hcfc22": 0.214,
+    "hcfc141b": 0.161,
+    "hcfc142b": 0.193,
+    # Hydrofluorocarbons
+    "hfc23": 0.191,
+    "hfc32": 0.111,
+    "hfc125": 0.234,
+    "hfc134a": 0.167,
+    "hfc134aeq": 0.167,
+    "hfc143a": 0.168,
+    "hfc152a": 0.102,
+    "hfc227ea": 0.273,
+    "hfc236fa": 0.251,
+    "hfc245fa": 0.245,
+    "hfc365mfc": 0.228,
+    "hfc4310mee": 0.357,
+    # Chlorocarbons and Hydrochlorocarbons
+    "ch3ccl3": 0.065,
+    "ccl4": 0.166,
+    "ch3cl": 0.005,
+    "ch2cl2": 0.029,
+    "chcl3": 0.074,
+    # Bromocarbons, Hydrobromocarbons and Halons
+    "ch3br": 0.004,
+    "halon1211": 0.300,
+    "halon1301": 0.299,
+    "halon2402": 0.312,
+    # Fully Fluorinated Species
+    "nf3": 0.204,
+    "sf6": 0.567,
+    "so2f2": 0.211,
+    "cf4": 0.099,
+    "c2f6": 0.261,
+    "c3f8": 0.270,
+    "cc4f8": 0.314,
+    "c4f10": 0.369,
+    "c5f12": 0.408,
+    "c6f14": 0.449,
+    "c7f16": 0.503,
+    "c8f18": 0.558,
+}
+"""Radiative efficiency of each gas, in `RADIATIVE_EFFICIENCIES_UNITS`"""
+
+TABLE_VERSION = "1"
+"""
+Version of the table
+
+Bump this whenever `RADIATIVE_EFFICIENCIES` or the conversions change.
+This invalidates any cached, converted tables.
+"""
+
+PPB_PER_UNIT = {
+    "ppm": 1e3,
+    "ppb": 1.0,
+    "ppt": 1e-3,
+    "1e-6": 1e3,
+    "1e-9": 1.0,
+    "1e-12": 1e-3,
+}
+"""Number of ppb in one of each of the concentration units we know about"""
+
+
+def get_default_units(gas: str) -> str:
+    """
+    Get the units in which we expect a gas' data to be
+
+    Used if the data doesn't say what its units are.
+    """
+    if gas == "co2":
+        return "ppm"
+
+    if gas in ("ch4", "n2o"):
+        return "ppb"
+
+    return "ppt"
+
+
+def get_data_units(loaded: xr.Dataset, gases: Iterable[str]) -> dict[str, str]:
+    """
+    Get the units of each gas' data
+
+    Parameters
+    ----------
+    loaded
+        Loaded data
+
+    gases
+        Gases for which to get the units
+
+    Returns
+    -------
+        Units of each gas' data, taken from its `units` attribute
+        (falling back to `get_default_units` if there isn't one)
+    """
+    return {
+        gas: loaded[gas].attrs.get("units", get_default_units(gas)) for gas in gases
+    }
+
+
+def _get_ppb_per_unit(units: str) -> float:
+    if units in PPB_PER_UNIT:
+        return PPB_PER_UNIT[units]
+
+    # Only pay for the unit registry if we really need it
+    import openscm_units
+
+    return openscm_units.unit_registry.Quantity(1, units).to("ppb").m
+
+
+def convert_radiative_efficiencies(data_units: Mapping[str, str]) -> dict[str, float]:
+    """
+    Convert radiative efficiencies to match the units of the data
+
+    Parameters
+    ----------
+    data_units
+        Units of each gas' data
+
+    Returns
+    -------
+        Radiative efficiency of each gas in W / m^2 per unit of the gas' data.
+        Gases without a radiative efficiency are not included.
+    """
+    return {
+        gas: RADIATIVE_EFFICIENCIES[gas] * _get_ppb_per_unit(units)
+        for gas, units in data_units.items()
+        if gas in RADIATIVE_EFFICIENCIES
+    }
+
+
+def get_radiative_efficiencies(
+    data_units: Mapping[str, str], cache_path: Path | None = None
+) -> dict[str, float]:
+    """
+    Get radiative efficiencies which match the units of the data
+
+    Parameters
+    ----------
+    data_units
+        Units of each gas' data (see `get_data_units`)
+
+    cache_path
+        Path to a JSON file in which to cache the converted table.
+        If it holds a table built from the same inputs, that table is used.
+        Otherwise, the table is built and written to `cache_path`.
+        If not supplied, the table is always built.
+
+    Returns
+    -------
+        Radiative efficiency of each gas in W / m^2 per unit of the gas' data
+        (see `convert_radiative_efficiencies`)
+    """
+    if cache_path is None:
+        return convert_radiative_efficiencies(data_units)
+
+    key = hashlib.sha256(
+        json.dumps(
+            {"table_version": TABLE_VERSION, "data_units": dict(data_units)},
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+    cache_path = Path(cache_path)
+    if cache_path.exists():
+        cached = json.loads(cache_path.read_text())
+        if cached["key"] == key:
+            return cached["radiative_efficiencies"]
+
+    out = convert_radiative_efficiencies(data_units)
+
+    cache_path.parent.mkdir(exist_ok=True, parents=True)
+    cache_path.write_text(
+        json.dumps(
+            {
+                "key": key,
+                "data_units": dict(data_units),
+                "radiative_efficiencies": out,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+    )
+
+    return out
@@ -0,0 +1,296 @@
+"""
+Loading of reference (i.e. non-CMIP) data
+
+Each source is described by a `ReferenceSourceSpec`.
+Adding a new source should only require adding a new spec.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+from utils import PROCESSED_DATA_DIR, RAW_DATA_DIR
+
+
+@dataclass(frozen=True)
+class ReferenceSourceSpec:
+    """
+    Specification of a reference data source
+    """
+
+    name: str
+    """Name of the source (used e.g. in plot legends)"""
+
+    path: Path
+    """Path to the source's data"""
+
+    data_format: Literal["wide", "long"] = "wide"
+    """
+    Format of the source's data
+
+    Wide data has a year column and one column per gas.
+    Long data has `year`, `gas` and `value` columns.
+    """
+
+    source_column: str | None = None
+    """
+    Column which splits long data into sub-sources (e.g. stations)
+
+    Sub-sources are named `"{name}: {value in source_column}"`.
+    """
+
+    variable_map: dict[str, str] = field(default_factory=dict)
+    """Map from the source's column names to normalised variable names"""
+
+    time_convention: Literal["start-of-year", "annual-mean"] = "start-of-year"
+    """
+    Time convention of the source's data
+
+    Start-of-year data is converted to mid-year values
+    (to match the annual-means in the CMIP data).
+    """
+
+    reader: Callable[[Path], pd.DataFrame] = pd.read_csv
+    """Function to use to read `path`"""
+
+
+def to_mid_year(values: np.ndarray) -> np.ndarray:
+    """
+    Convert start-of-year values to mid-year values
+
+    The mid-year value is the mean of the value at the start of the year
+    and the value at the start of the next year.
+    As a result, the output has one less row than the input.
+
+    Parameters
+    ----------
+    values
+        Start-of-year values (time along the first axis)
+
+    Returns
+    -------
+        Mid-year values
+    """
+    # Only one array is allocated, everything else is done in-place
+    out = np.add(values[:-1], values[1:])
+    out *= 0.5
+
+    return out
+
+
+def load_reference_source(spec: ReferenceSourceSpec) -> pd.DataFrame:
+    """
+    Load a reference data source
+
+    Parameters
+    ----------
+    spec
+        Specification of the source
+
+    Returns
+    -------
+        Loaded data, with a `year` column, a `source` column
+        and one column per (normalised) variable
+    """
+    if spec.data_format != "wide":
+        raise NotImplementedError(spec.data_format)
+
+    raw = spec.reader(spec.path).rename(
+        {"Year": "year", **spec.variable_map}, axis="columns"
+    )
+
+    years = raw["year"].to_numpy()
+    variables = [c for c in raw.columns if c != "year"]
+    values = raw[variables].to_numpy(dtype=np.float64)
+
+    if spec.time_convention == "start-of-year":
+        values = to_mid_year(values)
+        years = years[:-1]
+
+    elif spec.time_convention != "annual-mean":
+        raise NotImplementedError(spec.time_convention)
+
+    out = pd.DataFrame(values, columns=variables)
+    out.insert(0, "source", spec.name)
+    out.insert(0, "year", years)
+
+    return out
+
+
+def load_reference_source_long(spec: ReferenceSourceSpec) -> pd.DataFrame:
+    """
+    Load a reference data source into long format
+
+    Parameters
+    ----------
+    spec
+        Specification of the source
+
+    Returns
+    -------
+        Loaded data, with `gas`, `source`, `year` and `value` columns.
+        Rows without a value are dropped.
+    """
+    if spec.data_format == "wide":
+        out = load_reference_source(spec).melt(
+            id_vars=["year", "source"], var_name="gas", value_name="value"
+        )
+
+    elif spec.data_format == "long":
+        if spec.time_convention != "annual-mean":
+            raise NotImplementedError(spec.time_convention)
+
+        raw = spec.reader(spec.path)
+        if spec.source_column is None:
+            source = spec.name
+        else:
+            source = f"{spec.name}: " + raw[spec.source_column].astype(str)
+
+        out = pd.DataFrame(
+            {
+                "gas": raw["gas"].replace(spec.variable_map),
+                "source": source,
+                "year": raw["year"],
+                "value": raw["value"].astype(np.float64),
+            }
+        )
+
+    else:
+        raise NotImplementedError(spec.data_format)
+
+    return out.dropna(subset="value")[["gas", "source", "year", "value"]]
+
+
+def build_reference_store(specs: Iterable[ReferenceSourceSpec]) -> pd.DataFrame:
+    """
+    Build a single, long-format store of reference data
+
+    Parameters
+    ----------
+    specs
+        Specifications of the sources to include
+
+    Returns
+    -------
+        Reference data, with a `value` column,
+        indexed (and sorted) by `gas`, `source` and `year`.
+        `gas` and `source` are categorical,
+        with sources in the order of `specs`.
+    """
+    out = pd.concat(
+        [load_reference_source_long(spec) for spec in specs], ignore_index=True
+    )
+    out["gas"] = out["gas"].astype("category")
+    out["source"] = pd.Categorical(out["source"], categories=out["source"].unique())
+
+    return out.set_index(["gas", "source", "year"]).sort_index()
+
+
+def get_reference_data(reference_store: pd.DataFrame, gas: str) -> pd.DataFrame:
+    """
+    Get all reference data for a gas
+
+    Parameters
+    ----------
+    reference_store
+        Store from which to get data (see `build_reference_store`)
+
+    gas
+        Gas for which to get data
+
+    Returns
+    -------
+        Data for `gas` with `year` and `source` columns
+        and the values in a column named `gas`
+        (i.e. ready to be concatenated with CMIP data for plotting).
+        Empty if there is no data for `gas`.
+    """
+    if gas not in reference_store.index.levels[0]:
+        return pd.DataFrame(columns=["year", "source", gas])
+
+    out = reference_store.loc[gas].reset_index()
+
+    return out.rename({"value": gas}, axis="columns")[["year", "source", gas]]
+
+
+WMO_CH7_SPEC = ReferenceSourceSpec(
+    name="WMO 2022 Ch. 7",
+    path=RAW_DATA_DIR / "wmo-2022" / "wmo2022_Ch7_mixingratios.xlsx",
+    # Created with:
+    # `# {k: k.lower().replace("-", "") for k in wmo_ch7_df.columns}`
+    variable_map={
+        "CFC-11": "cfc11",
+        "CFC-12": "cfc12",
+        "CFC-113": "cfc113",
+        "CFC-114": "cfc114",
+        "CFC-115": "cfc115",
+        "CCl4": "ccl4",
+        "CH3CCl3": "ch3ccl3",
+        "HCFC-22": "hcfc22",
+        "HCFC-141b": "hcfc141b",
+        "HCFC-142b": "hcfc142b",
+        "halon-1211": "halon1211",
+        "halon-1202": "halon1202",
+        "halon-1301": "halon1301",
+        "halon-2402": "halon2402",
+        "CH3Br": "ch3br",
+        "CH3Cl": "ch3cl",
+    },
+    reader=pd.read_excel,
+)
+
+WESTERN_SPEC = ReferenceSourceSpec(
+    name="Western et al., 2024",
+    path=PROCESSED_DATA_DIR / "western-et-al-2024" / "hcfc_projections.csv",
+    variable_map={
+        "HCFC-22": "hcfc22",
+        "HCFC-141b": "hcfc141b",
+        "HCFC-142b": "hcfc142b",
+    },
+)
+
+VELDERS_SPEC = ReferenceSourceSpec(
+    name="Velders et al., 2022",
+    path=PROCESSED_DATA_DIR / "velders-et-al-2022" / "hfc_projections.csv",
+    variable_map={
+        "HFC-32": "hfc32",
+        "HFC-125": "hfc125",
+        "HFC-134a": "hfc134a",
+        "HFC-143a": "hfc143a",
+        "HFC-152a": "hfc152a",
+        "HFC-227ea": "hfc227ea",
+        "HFC-236fa": "hfc236fa",
+        "HFC-245fa": "hfc245fa",
+        "HFC-365mfc": "hfc365mfc",
+        "HFC-43-10mee": "hfc4310mee",
+    },
+)
+
+ADAM_SPEC = ReferenceSourceSpec(
+    name="Adam et al., 2024",
+    path=PROCESSED_DATA_DIR / "adam-et-al-2024" / "hfc23_projections.csv",
+    time_convention="annual-mean",
+)
+
+DROSTE_SPEC = ReferenceSourceSpec(
+    name="Droste et al., 2020",
+    path=PROCESSED_DATA_DIR / "droste-et-al-2020" / "pfcs_data.csv",
+    data_format="long",
+    source_column="station",
+    time_convention="annual-mean",
+)
+
+REFERENCE_SOURCE_SPECS = (
+    WMO_CH7_SPEC,
+    WESTERN_SPEC,
+    VELDERS_SPEC,
+    DROSTE_SPEC,
+    ADAM_SPEC,
+)
+"""Specifications of all the reference sources we compare against"""
@@ -0,0 +1,716 @@
+"""
+Rendering of figures
+
+Figures are described by `FigureJob`s,
+which can either be shown in a notebook
+or rendered in batch (in parallel, headless)
+with `render_figures`.
+In batch mode, figures whose inputs haven't changed
+since they were last rendered are skipped.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import multiprocessing
+import sys
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import matplotlib
+import matplotlib.axes
+import matplotlib.figure
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import tqdm
+import xarray as xr
+
+from differences import get_gas_difference
+from plotting import select_years
+from reference_data import (
+    ADAM_SPEC,
+    DROSTE_SPEC,
+    VELDERS_SPEC,
+    WESTERN_SPEC,
+    WMO_CH7_SPEC,
+)
+
+RENDER_VERSION = "1"
+"""
+Version of the rendering code
+
+Changes to the module which defines a job's render function
+(and the modules next to it from which it imports)
+are picked up automatically (see `get_job_hash`).
+Bump this whenever code elsewhere changes how figures look.
+"""
+
+MANIFEST_NAME = ".render-manifest.json"
+"""Name of the file in which the hashes of rendered figures' inputs are kept"""
+
+RASTER_DPI = 150
+"""Resolution of rasterised elements (e.g. scatter markers) in vector outputs"""
+
+RASTERIZE_ABOVE_N_POINTS = 50_000
+"""
+Number of points in a scatter plot above which the markers are rasterised
+
+Below this, vector markers give smaller files than the rasterised images.
+"""
+
+
+@dataclass(frozen=True)
+class FigureJob:
+    """
+    Description of a figure to render
+    """
+
+    filename: str
+    """Name of the file to which to write the figure"""
+
+    render: Callable[..., matplotlib.figure.Figure]
+    """
+    Function which creates the figure
+
+    Must be importable (i.e. not defined in a notebook)
+    so that it can be used in other processes.
+    """
+
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    """Keyword arguments to pass to `render`"""
+
+    def make_figure(self) -> matplotlib.figure.Figure:
+        """
+        Make the figure
+        """
+        return self.render(**self.kwargs)
+
+
+def _update_hash(h: Any, obj: Any) -> None:
+    if isinstance(obj, pd.DataFrame):
+        _update_hash(h, list(obj.columns))
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+
+    elif isinstance(obj, pd.Series):
+        _update_hash(h, obj.name)
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+
+    elif isinstance(obj, xr.DataArray):
+        _update_hash(h, obj.name)
+        _update_hash(h, obj.attrs)
+        _update_hash(h, {k: v.to_numpy() for k, v in obj.coords.items()})
+        _update_hash(h, obj.to_numpy())
+
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype, obj.shape)).encode())
+        if obj.dtype.hasobject:
+            h.update(repr(obj.tolist()).encode())
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=repr):
+            _update_hash(h, k)
+            _update_hash(h, obj[k])
+
+    elif isinstance(obj, list | tuple):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for v in obj:
+            _update_hash(h, v)
+
+    else:
+        h.update(repr(obj).encode())
+
+
+@functools.cache
+def _get_render_source(module_name: str) -> list[str]:
+    # The module's source, plus that of the modules next to it
+    # from which it imports (e.g. `plotting` for `rendering`)
+    module = sys.modules[module_name]
+    module_dir = Path(module.__file__).parent
+
+    imported_from = {getattr(v, "__module__", None) for v in vars(module).values()}
+    sources = [inspect.getsource(module)]
+    for name in sorted(imported_from - {module_name, None}):
+        dependency = sys.modules.get(name)
+        dependency_file = getattr(dependency, "__file__", None)
+        if dependency_file is not None and Path(dependency_file).parent == module_dir:
+            sources.append(inspect.getsource(dependency))
+
+    return sources
+
+
+def get_job_hash(job: FigureJob) -> str:
+    """
+    Get a hash of everything which goes into a figure job
+
+    This covers the job's inputs and the code which renders it:
+    the source of the module which defines the render function
+    and of the modules (in the same directory) from which that module imports,
+    `RENDER_VERSION` and matplotlib's version.
+    """
+    h = hashlib.sha256()
+    _update_hash(h, f"{job.render.__module__}.{job.render.__qualname__}")
+    _update_hash(h, _get_render_source(job.render.__module__))
+    _update_hash(h, (RENDER_VERSION, matplotlib.__version__))
+    _update_hash(h, job.kwargs)
+
+    return h.hexdigest()
+
+
+def _init_worker() -> None:
+    matplotlib.use("Agg", force=True)
+
+
+def _render_job(job: FigureJob, out_path: Path) -> None:
+    fig = job.make_figure()
+    fig.savefig(out_path, dpi=RASTER_DPI)
+    plt.close(fig)
+
+
+def render_figures(
+    jobs: Iterable[FigureJob], out_dir: Path, n_workers: int = 1, force: bool = False
+) -> list[str]:
+    """
+    Render figures headlessly, in parallel
+
+    Parameters
+    ----------
+    jobs
+        Figures to render
+
+    out_dir
+        Directory in which to write the figures
+
+    n_workers
+        Number of processes to use for rendering
+
+    force
+        Render all figures, even if their inputs haven't changed
+
+    Returns
+    -------
+        Filenames of the figures which were rendered
+        (i.e. excluding those which were skipped)
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(exist_ok=True, parents=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    to_render = []
+    for job in jobs:
+        job_hash = get_job_hash(job)
+        if (
+            not force
+            and manifest.get(job.filename) == job_hash
+            and (out_dir / job.filename).exists()
+        ):
+            continue
+
+        to_render.append((job, job_hash))
+
+    if not to_render:
+        return []
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        futures = {
+            executor.submit(_render_job, job, out_dir / job.filename): (job, job_hash)
+            for job, job_hash in to_render
+        }
+        for future in tqdm.tqdm(futures, desc="Rendering figures"):
+            future.result()
+            job, job_hash = futures[future]
+            manifest[job.filename] = job_hash
+            # Write as we go so a failure doesn't lose everything done so far
+            manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    return [job.filename for job, _ in to_render]
+
+
+def get_markers(n: int) -> list[str | tuple[int, int, float]]:
+    """
+    Get `n` distinct markers
+
+    These are the same markers, in the same order, as seaborn uses.
+    """
+    markers: list[str | tuple[int, int, float]] = [
+        "o",
+        "X",
+        (4, 0, 45),
+        "P",
+        (4, 0, 0),
+        (4, 1, 0),
+        "^",
+        (4, 1, 45),
+        "v",
+    ]
+    n_sides = 5
+    while len(markers) < n:
+        angle = 360 / (n_sides + 1) / 2
+        markers.extend(
+            [
+                (n_sides + 1, 1, angle),
+                (n_sides + 1, 0, angle),
+                (n_sides, 1, 0),
+                (n_sides, 0, 0),
+            ]
+        )
+        n_sides += 1
+
+    return markers[:n]
+
+
+def scatter_by_source(
+    ax: matplotlib.axes.Axes,
+    pdf: pd.DataFrame,
+    y: str,
+    palette: dict[str, str] | None = None,
+    rasterized: bool | None = None,
+    alpha: float = 0.4,
+    s: float = 75,
+) -> None:
+    """
+    Scatter plot, with one colour and marker per source
+
+    This looks like `sns.scatterplot(data=pdf, x="year", y=y, hue="source",
+    style="source", ...)`, but draws each source with a single `ax.scatter` call
+    and skips seaborn's semantic mapping, which is slow for large mosaics.
+
+    Parameters
+    ----------
+    ax
+        Axes on which to plot
+
+    pdf
+        Data to plot, with `year` and `source` columns
+        and the data to plot in column `y`.
+        If `source` is categorical, sources are drawn in the order of its categories,
+        otherwise in the order in which they appear.
+
+    y
+        Column to plot
+
+    palette
+        Colour to use for each source.
+        Sources which aren't in `palette` use matplotlib's colour cycle.
+
+    rasterized
+        Rasterise the markers.
+        With many points, this makes vector outputs (e.g. PDF)
+        much smaller and faster to write and view,
+        while axes, labels etc. stay as vectors.
+        If `None`, markers are rasterised
+        if there are more than `RASTERIZE_ABOVE_N_POINTS` points.
+
+    alpha
+        Transparency of the markers
+
+    s
+        Size of the markers
+    """
+    if isinstance(pdf["source"].dtype, pd.CategoricalDtype):
+        sources = list(pdf["source"].cat.categories)
+    else:
+        sources = list(pdf["source"].unique())
+
+    if palette is None:
+        palette = {}
+
+    if rasterized is None:
+        rasterized = pdf.shape[0] > RASTERIZE_ABOVE_N_POINTS
+
+    default_colours = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    # Same edge width seaborn would use
+    linewidth = 0.08 * np.sqrt(s)
+    for i, (source, marker) in enumerate(zip(sources, get_markers(len(sources)))):
+        source_data = pdf[pdf["source"] == source]
+        ax.scatter(
+            source_data["year"].to_numpy(),
+            source_data[y].to_numpy(),
+            label=source,
+            color=palette.get(source, default_colours[i % len(default_colours)]),
+            marker=marker,
+            s=s,
+            alpha=alpha,
+            edgecolor="w",
+            linewidth=linewidth,
+            rasterized=rasterized,
+        )
+
+    ax.set_xlabel("year")
+    ax.set_ylabel(y)
+    if sources:
+        ax.legend(title="source")
+
+
+def plot_comparison_grid(
+    frames: dict[str, pd.DataFrame],
+    mosaic: list[list[str]],
+    palette: dict[str, str],
+    title: str,
+    rasterized: bool | None = None,
+) -> matplotlib.figure.Figure:
+    """
+    Plot a grid comparing sources for many gases
+
+    Parameters
+    ----------
+    frames
+        Data to plot for each gas
+        (see `plotting.build_comparison_frame`)
+
+    mosaic
+        Layout of the gases in the grid
+
+    palette
+        Colour to use for each source
+
+    title
+        Title of the figure
+
+    rasterized
+        Rasterise the scatter markers (see `scatter_by_source`)
+
+    Returns
+    -------
+        Created figure
+    """
+    fig, axes = plt.subplot_mosaic(
+        mosaic,
+        figsize=(12, 4.5 * len(mosaic)),
+    )
+
+    for data_var, pdf in frames.items():
+        scatter_by_source(
+            axes[data_var],
+            pdf,
+            y=data_var,
+            palette=palette,
+            rasterized=rasterized,
+            alpha=0.4,
+            s=75,
+        )
+
+        axes[data_var].axhline(0, linestyle="--", color="k")
+
+    fig.suptitle(title)
+
+    fig.tight_layout()
+
+    return fig
+
+
+def plot_time_windows(
+    da: xr.DataArray,
+    title: str,
+    ylim: tuple[float, float] | None = None,
+    hue: str = "source_id",
+    **kwargs: Any,
+) -> matplotlib.figure.Figure:
+    """
+    Plot data over all years, the historical period and recent years
+
+    Parameters
+    ----------
+    da
+        Data to plot, with a `year` dimension and (optionally) `hue` dimension
+
+    title
+        Title of the figure
+
+    ylim
+        y-limits to apply to each panel
+
+    hue
+        Dimension which gives each line
+
+    **kwargs
+        Passed to `da.plot.line`
+
+    Returns
+    -------
+        Created figure
+    """
+    fig, axes = plt.subplot_mosaic(
+        [["recent", "recent"], ["all", "historical"]], figsize=(10, 6)
+    )
+
+    for time_axis, ax in (
+        (slice(None, None), "all"),
+        (slice(1950, None), "recent"),
+        (slice(1750, None), "historical"),
+    ):
+        da.sel(year=time_axis).plot.line(x="year", hue=hue, ax=axes[ax], **kwargs)
+        if ylim is not None:
+            axes[ax].set_ylim(ylim)
+
+    fig.suptitle(title)
+
+    fig.tight_layout()
+
+    return fig
+
+
+def get_mosaic(gases: list[str], grid_width: int = 3) -> list[list[str]]:
+    """
+    Get a mosaic (see `plt.subplot_mosaic`) with one panel per gas
+
+    Parameters
+    ----------
+    gases
+        Gases to lay out
+
+    grid_width
+        Number of panels in each row
+
+    Returns
+    -------
+        Mosaic, with the last row padded with empty panels
+    """
+    mosaic = [gases[i : i + grid_width] for i in range(0, len(gases), grid_width)]
+    if len(mosaic[-1]) < grid_width:
+        padding = grid_width - len(mosaic[-1])
+        mosaic[-1].extend(padding * [""])
+
+    return mosaic
+
+
+def get_palette(base_source_id: str, compare_source_id: str) -> dict[str, str]:
+    """
+    Get the colour to use for each source
+
+    Parameters
+    ----------
+    base_source_id
+        CMIP source ID we're comparing against (e.g. CMIP6)
+
+    compare_source_id
+        CMIP source ID we're comparing
+
+    Returns
+    -------
+        Colour to use for each source
+    """
+    return {
+        WMO_CH7_SPEC.name: "black",
+        VELDERS_SPEC.name: "tab:cyan",
+        WESTERN_SPEC.name: "tab:green",
+        ADAM_SPEC.name: "tab:green",
+        base_source_id: "tab:purple",
+        compare_source_id: "tab:blue",
+        f"{DROSTE_SPEC.name}: Cape Grim": "tab:green",
+        f"{DROSTE_SPEC.name}: Talconeston": "tab:red",
+        "CR-CMIP-0-3-0": "tab:gray",
+        "CR-CMIP-testing": "tab:pink",
+    }
+
+
+def get_comparison_jobs(
+    comparison_frames: dict[str, pd.DataFrame],
+    gases: list[str],
+    palette: dict[str, str],
+    time_ranges: Iterable[range],
+) -> list[FigureJob]:
+    """
+    Get the jobs which plot comparisons against other data sources
+
+    Parameters
+    ----------
+    comparison_frames
+        Data to plot for each gas (see `plotting.build_comparison_frames`)
+
+    gases
+        Gases to plot
+
+    palette
+        Colour to use for each source
+
+    time_ranges
+        Time ranges to plot (one figure per time range)
+
+    Returns
+    -------
+        Jobs
+    """
+    mosaic = get_mosaic(gases)
+
+    return [
+        FigureJob(
+            filename=f"comparison_{time_range[0]}-{time_range[-1]}.pdf",
+            render=plot_comparison_grid,
+            kwargs=dict(
+                frames={
+                    gas: select_years(comparison_frames[gas], time_range)
+                    for gas in gases
+                },
+                mosaic=mosaic,
+                palette=palette,
+                title=str(time_range),
+            ),
+        )
+        for time_range in time_ranges
+    ]
+
+
+def get_difference_jobs(
+    loaded: xr.Dataset,
+    differences: xr.Dataset,
+    gases: list[str],
+    compare_source_id: str,
+    base_source_id: str,
+) -> list[FigureJob]:
+    """
+    Get the jobs which plot the values of and differences between CMIP sources
+
+    Parameters
+    ----------
+    loaded
+        Loaded CMIP data
+
+    differences
+        Differences between the sources
+        (see `differences.compute_differences`)
+
+    gases
+        Gases to plot
+
+    compare_source_id
+        Source ID which was compared
+
+    base_source_id
+        Source ID which was compared against
+
+    Returns
+    -------
+        Jobs
+    """
+    suffix = f"({compare_source_id} - {base_source_id})"
+
+    jobs = []
+    for gas in gases:
+        parray = loaded[gas].dropna("source_id", how="all").compute()
+
+        jobs.append(
+            FigureJob(
+                filename=f"{gas}_values.pdf",
+                render=plot_time_windows,
+                kwargs=dict(da=parray, title=parray.name, linewidth=3, alpha=0.4),
+            )
+        )
+
+        if not np.isnan(differences["radiative_efficiency"].sel(gas=gas).item()):
+            jobs.append(
+                FigureJob(
+                    filename=f"{gas}_erf-difference.pdf",
+                    render=plot_time_windows,
+                    kwargs=dict(
+                        da=get_gas_difference(differences, "erf", gas),
+                        title=f"{parray.name} ERF difference {suffix}",
+                        alpha=0.9,
+                    ),
+                )
+            )
+
+        jobs.append(
+            FigureJob(
+                filename=f"{gas}_absolute-difference.pdf",
+                render=plot_time_windows,
+                kwargs=dict(
+                    da=get_gas_difference(differences, "absolute", gas),
+                    title=f"{parray.name} absolute difference {suffix}",
+                    alpha=0.9,
+                ),
+            )
+        )
+
+        jobs.append(
+            FigureJob(
+                filename=f"{gas}_percentage-difference.pdf",
+                render=plot_time_windows,
+                kwargs=dict(
+                    da=get_gas_difference(differences, "relative", gas),
+                    title=f"{parray.name} percentage difference {suffix}",
+                    ylim=(-10, 10),
+                    alpha=0.9,
+                ),
+            )
+        )
+
+    return jobs
+
+
+def get_regional_difference_jobs(
+    differences: xr.Dataset,
+    gases: list[str],
+    compare_source_id: str,
+    base_source_id: str,
+) -> list[FigureJob]:
+    """
+    Get the jobs which plot the differences between CMIP sources in each region
+
+    Parameters
+    ----------
+    differences
+        Differences between the sources, with a `region` dimension
+        (see `differences.compute_differences` and `spatial.load_regional`)
+
+    gases
+        Gases to plot
+
+    compare_source_id
+        Source ID which was compared
+
+    base_source_id
+        Source ID which was compared against
+
+    Returns
+    -------
+        Jobs (one per gas and kind of difference).
+        Regions in which either source has no data are left out.
+    """
+    suffix = f"({compare_source_id} - {base_source_id})"
+
+    jobs = []
+    for gas in gases:
+        has_rad_eff = not np.isnan(
+            differences["radiative_efficiency"].sel(gas=gas).item()
+        )
+        for kind, label, ylim in (
+            ("erf", "ERF", None),
+            ("absolute", "absolute", None),
+            ("relative", "percentage", (-10, 10)),
+        ):
+            if kind == "erf" and not has_rad_eff:
+                continue
+
+            da = get_gas_difference(differences, kind, gas).dropna("region", how="all")
+            if da.sizes["region"] == 0:
+                continue
+
+            jobs.append(
+                FigureJob(
+                    filename=f"{gas}_regional_{label.lower()}-difference.pdf",
+                    render=plot_time_windows,
+                    kwargs=dict(
+                        da=da,
+                        title=f"{gas} regional {label} difference {suffix}",
+                        ylim=ylim,
+                        hue="region",
+                        alpha=0.9,
+                    ),
+                )
+            )
+
+    return jobs
@@ -0,0 +1,364 @@
+"""
+Seasonal-cycle diagnostics from monthly data
+
+Monthly data is reshaped onto a (year, month) grid,
+then the amplitude and phase of each year's seasonal cycle
+are calculated for all years (and gases) at once
+with array operations, rather than year by year.
+Only these per-year diagnostics are kept,
+so they can be cached and stored exactly like annual-means
+(see `cache.AnnualMeanCache` and `cache.load_annual_means`).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from differences import get_gas_difference
+from loading import load_cmip6_data, load_cmip7_data
+from rendering import FigureJob, plot_time_windows
+
+SEASONAL_LOADER_VERSION = "1"
+"""
+Version of the seasonal-cycle loading code
+
+Bump this whenever the loading code changes
+in a way which changes its output (see `cache.AnnualMeanCache`).
+"""
+
+DIAGNOSTICS = ("amplitude", "phase")
+"""Seasonal-cycle diagnostics we calculate"""
+
+MONTHS_PER_YEAR = 12
+
+
+def get_diagnostic_variable(gas: str, diagnostic: str) -> str:
+    """
+    Get the name of the variable which holds a gas' seasonal-cycle diagnostic
+    """
+    return f"{gas}_{diagnostic}"
+
+
+def to_year_month(da: xr.DataArray) -> xr.DataArray:
+    """
+    Reshape monthly data onto a (year, month) grid
+
+    Parameters
+    ----------
+    da
+        Monthly data.
+        Must have integer `year` and `month` co-ordinates along its `time` dimension
+        (e.g. from `cf_time.assign_year_month_coords`).
+
+    Returns
+    -------
+        Data with `year` and `month` dimensions in place of `time`
+        (followed by any other dimensions).
+        Years run continuously from the first to the last year in `da`,
+        months which aren't in `da` are NaN.
+    """
+    year = da["year"].values
+    month = da["month"].values
+    years = np.arange(year.min(), year.max() + 1)
+
+    values = da.transpose("time", ...).values
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+
+    out = np.full((years.size, MONTHS_PER_YEAR, *values.shape[1:]), np.nan)
+    out[year - years[0], month - 1] = values
+
+    other_dims = [dim for dim in da.dims if dim != "time"]
+
+    return xr.DataArray(
+        out,
+        dims=("year", "month", *other_dims),
+        coords={
+            "year": years,
+            "month": np.arange(1, MONTHS_PER_YEAR + 1),
+            **{dim: da[dim] for dim in other_dims if dim in da.coords},
+        },
+        name=da.name,
+        attrs=da.attrs,
+    )
+
+
+def get_trend(da: xr.DataArray) -> xr.DataArray:
+    """
+    Get the trend underlying monthly data
+
+    The trend is a centred, 2x12-month running mean,
+    which removes a (constant) seasonal cycle exactly
+    and keeps linear trends exactly.
+
+    Parameters
+    ----------
+    da
+        Data on a (year, month) grid (see `to_year_month`)
+
+    Returns
+    -------
+        Trend, on the same grid as `da`.
+        NaN in the first and last six months
+        and wherever the running mean's window includes missing months.
+    """
+    values = da.values
+    flat = values.reshape(-1, *values.shape[2:])
+
+    weights = np.ones(MONTHS_PER_YEAR + 1) / MONTHS_PER_YEAR
+    weights[[0, -1]] /= 2
+    windows = np.lib.stride_tricks.sliding_window_view(flat, weights.size, axis=0)
+
+    half_window = MONTHS_PER_YEAR // 2
+    trend = np.full_like(flat, np.nan)
+    trend[half_window:-half_window] = windows @ weights
+
+    return da.copy(data=trend.reshape(values.shape))
+
+
+def calculate_seasonal_cycle_diagnostics(da: xr.DataArray) -> xr.Dataset:
+    """
+    Calculate the amplitude and phase of each year's seasonal cycle
+
+    The trend is removed first (see `get_trend`),
+    so the growth of the gas over the year isn't mistaken for seasonality.
+
+    Parameters
+    ----------
+    da
+        Data on a (year, month) grid (see `to_year_month`)
+
+    Returns
+    -------
+        Diagnostics, on a `year` dimension:
+
+        - `amplitude`: peak-to-trough amplitude (same units as `da`)
+        - `phase`: month in which the first harmonic of the cycle peaks
+          (fractional, 1.0 is January, 12.0 is December,
+          12.5 is halfway between December and the next January)
+
+        Years with any months without a trend
+        (including the first and last year) are NaN.
+    """
+    anomaly = da - get_trend(da)
+
+    amplitude = anomaly.max("month", skipna=False) - anomaly.min("month", skipna=False)
+
+    angular_frequency = 2 * np.pi / MONTHS_PER_YEAR
+    month_index = xr.DataArray(
+        np.arange(MONTHS_PER_YEAR), dims="month", coords={"month": da["month"]}
+    )
+    first_harmonic = (anomaly * np.exp(-1j * angular_frequency * month_index)).sum(
+        "month", skipna=False
+    )
+    phase = (
+        -xr.apply_ufunc(np.angle, first_harmonic) / angular_frequency
+    ) % MONTHS_PER_YEAR + 1
+
+    amplitude.attrs = da.attrs
+    phase.attrs = {"units": "month"}
+
+    return xr.Dataset({"amplitude": amplitude, "phase": phase})
+
+
+def load_seasonal_cycle(source_id: str, fps: list[Path]) -> xr.Dataset:
+    """
+    Load monthly data and calculate its seasonal-cycle diagnostics
+
+    Can be used as the loader of a `cache.AnnualMeanCache`,
+    so diagnostics are cached and stored like annual-means.
+    The whole monthly (global-mean) record in `fps` is read into memory,
+    as the trend at each month depends on its neighbours.
+    This isn't streamed, but is small
+    (one value per month per variable).
+    Only the per-year diagnostics are returned,
+    so only they end up in the cache and store.
+
+    Parameters
+    ----------
+    source_id
+        Source ID of the data
+
+    fps
+        Monthly files to load
+
+    Returns
+    -------
+        Diagnostics on a `year` dimension, with a scalar `source_id` co-ordinate.
+        Each variable in the files gives one variable per diagnostic
+        (see `get_diagnostic_variable`).
+        Bounds variables are dropped.
+    """
+    if "UoM" in source_id:
+        ds = load_cmip6_data(fps, lazy=True, fast_time=True)
+
+    else:
+        ds = load_cmip7_data(fps, lazy=True, fast_time=True)
+
+    data_vars = {}
+    for name, da in ds.data_vars.items():
+        if "bnds" in name:
+            continue
+
+        diagnostics = calculate_seasonal_cycle_diagnostics(to_year_month(da))
+        for diagnostic in DIAGNOSTICS:
+            data_vars[get_diagnostic_variable(name, diagnostic)] = diagnostics[
+                diagnostic
+            ]
+
+    return xr.Dataset(data_vars, attrs=ds.attrs).assign_coords(source_id=source_id)
+
+
+def compute_seasonal_differences(
+    loaded: xr.Dataset,
+    compare_source_id: str,
+    base_source_id: str,
+    gases: Iterable[str],
+) -> xr.Dataset:
+    """
+    Compute the differences in seasonal cycles between two sources
+
+    All gases are handled at once.
+
+    Parameters
+    ----------
+    loaded
+        Loaded diagnostics (see `load_seasonal_cycle`),
+        with `source_id` and `year` dimensions
+
+    compare_source_id
+        Source ID to compare
+
+    base_source_id
+        Source ID to compare against
+
+    gases
+        Gases to compare
+
+    Returns
+    -------
+        Differences, with `gas` and `year` dimensions and variables:
+
+        - `amplitude`: `compare_source_id`'s amplitude minus `base_source_id`'s
+        - `amplitude_relative`: amplitude difference
+          as a percentage of `compare_source_id`'s amplitude
+        - `phase`: `compare_source_id`'s phase minus `base_source_id`'s,
+          wrapped to [-6, 6) months (positive means a later peak)
+        - `amplitude_max`, `amplitude_relative_max` and `phase_max`:
+          maximum magnitude of each difference over all years
+    """
+    gases = sorted(gases)
+    source_ids = [compare_source_id, base_source_id]
+
+    stacked = {
+        diagnostic: loaded[[get_diagnostic_variable(gas, diagnostic) for gas in gases]]
+        .sel(source_id=source_ids)
+        .to_dataarray("gas")
+        .assign_coords(gas=gases)
+        .transpose("gas", "source_id", "year", ...)
+        .compute()
+        for diagnostic in DIAGNOSTICS
+    }
+
+    def difference(diagnostic: str) -> xr.DataArray:
+        da = stacked[diagnostic]
+
+        return da.sel(source_id=compare_source_id, drop=True) - da.sel(
+            source_id=base_source_id, drop=True
+        )
+
+    amplitude = difference("amplitude")
+    half_year = MONTHS_PER_YEAR / 2
+    out = xr.Dataset(
+        {
+            "amplitude": amplitude,
+            "amplitude_relative": amplitude
+            / stacked["amplitude"].sel(source_id=compare_source_id, drop=True)
+            * 100,
+            "phase": (difference("phase") + half_year) % MONTHS_PER_YEAR - half_year,
+        }
+    )
+    for name in ("amplitude", "amplitude_relative", "phase"):
+        out[f"{name}_max"] = np.abs(out[name]).max("year")
+
+    for name in ("phase", "phase_max"):
+        out[name].attrs["units"] = "month"
+
+    for name in ("amplitude_relative", "amplitude_relative_max"):
+        out[name].attrs["units"] = "%"
+
+    return out
+
+
+def get_seasonal_cycle_jobs(
+    loaded: xr.Dataset,
+    seasonal_differences: xr.Dataset,
+    gases: list[str],
+    compare_source_id: str,
+    base_source_id: str,
+) -> list[FigureJob]:
+    """
+    Get the jobs which plot the seasonal cycles of and differences between sources
+
+    Parameters
+    ----------
+    loaded
+        Loaded seasonal-cycle diagnostics (see `load_seasonal_cycle`)
+
+    seasonal_differences
+        Differences between the sources' seasonal cycles
+        (see `compute_seasonal_differences`)
+
+    gases
+        Gases to plot
+
+    compare_source_id
+        Source ID which was compared
+
+    base_source_id
+        Source ID which was compared against
+
+    Returns
+    -------
+        Jobs (one per gas and diagnostic for both the values and the differences)
+    """
+    suffix = f"({compare_source_id} - {base_source_id})"
+
+    jobs = []
+    for gas in gases:
+        for diagnostic in DIAGNOSTICS:
+            parray = (
+                loaded[get_diagnostic_variable(gas, diagnostic)]
+                .dropna("source_id", how="all")
+                .compute()
+            )
+
+            jobs.append(
+                FigureJob(
+                    filename=f"{gas}_seasonal-cycle-{diagnostic}.pdf",
+                    render=plot_time_windows,
+                    kwargs=dict(
+                        da=parray,
+                        title=f"{gas} seasonal-cycle {diagnostic}",
+                        linewidth=3,
+                        alpha=0.4,
+                    ),
+                )
+            )
+            jobs.append(
+                FigureJob(
+                    filename=f"{gas}_seasonal-cycle-{diagnostic}-difference.pdf",
+                    render=plot_time_windows,
+                    kwargs=dict(
+                        da=get_gas_difference(seasonal_differences, diagnostic, gas),
+                        title=f"{gas} seasonal-cycle {diagnostic} difference {suffix}",
+                        alpha=0.9,
+                    ),
+                )
+            )
+
+    return jobs
@@ -0,0 +1,300 @@
+"""
+Spatially resolved (hemispheric and latitudinal band) comparison
+
+CMIP data comes on different spatial grids:
+global- and hemispheric-means (CMIP6's sectors)
+and latitudinal bands of various widths.
+To compare them, we aggregate everything onto a common set of regions,
+using area weights.
+Data is loaded lazily, in chunks along time,
+and aggregated to regions before anything else is done,
+so memory use is bounded by the chunk size,
+no matter how finely resolved or long the input is.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from cf_time import assign_year_month_coords
+from loading import (
+    CMIP6_TO_CMIP7_VARIABLE_MAP,
+    CMIP7_TO_NORMAL_VARIABLE_MAP,
+    annual_mean,
+    fix_cmip6_time_axis,
+)
+
+REGIONS: dict[str, tuple[float, float]] = {
+    "global": (-90.0, 90.0),
+    "northern-hemisphere": (0.0, 90.0),
+    "southern-hemisphere": (-90.0, 0.0),
+    "30N-90N": (30.0, 90.0),
+    "0-30N": (0.0, 30.0),
+    "30S-0": (-30.0, 0.0),
+    "90S-30S": (-90.0, -30.0),
+}
+"""Regions onto which we aggregate, with their (southern, northern) latitudes"""
+
+CMIP6_SECTOR_REGIONS = {
+    0: "global",
+    1: "northern-hemisphere",
+    2: "southern-hemisphere",
+}
+"""Region of each sector in CMIP6's `gr1-GMNHSH` files"""
+
+SPATIAL_GRID_LABELS = ("gn-15x360deg", "gnz", "gr1z", "gr1-GMNHSH")
+"""
+Grid labels of the spatially resolved files we compare
+
+In order of preference (latitudinal bands give us every region,
+hemispheric-means only some).
+"""
+
+SPATIAL_FILE_PATTERNS = tuple(
+    f"*_{grid_label}_*.nc" for grid_label in SPATIAL_GRID_LABELS
+)
+"""Patterns which match the spatially resolved files we compare"""
+
+TIME_CHUNK_SIZE = 12 * 50
+"""Number of timesteps to load at once"""
+
+REGIONAL_LOADER_VERSION = "1"
+"""
+Version of the regional loading code
+
+Bump this whenever the loading code changes
+in a way which changes its output (see `cache.AnnualMeanCache`).
+"""
+
+
+def select_grid_labels(
+    db: pd.DataFrame, preference: tuple[str, ...] = SPATIAL_GRID_LABELS
+) -> pd.DataFrame:
+    """
+    Select a single grid label for each variable and source ID
+
+    Parameters
+    ----------
+    db
+        Files to load.
+        Must have columns `variable_normalised`, `source_id` and `grid_label`.
+
+    preference
+        Grid labels to consider, in order of preference
+
+    Returns
+    -------
+        Files on the most preferred grid available
+        for each (variable, source ID) combination
+        (so a single loading task never mixes grids)
+    """
+    db = db[db["grid_label"].isin(preference)]
+    rank = db["grid_label"].map({label: i for i, label in enumerate(preference)})
+    best_rank = rank.groupby([db["variable_normalised"], db["source_id"]]).transform(
+        "min"
+    )
+
+    return db[rank == best_rank]
+
+
+def get_lat_bounds(ds: xr.Dataset) -> np.ndarray:
+    """
+    Get the bounds of each latitude in a dataset
+
+    Parameters
+    ----------
+    ds
+        Dataset, with a `lat` dimension
+
+    Returns
+    -------
+        Southern and northern bound of each latitude (shape `(n_lat, 2)`).
+        Taken from the bounds variable if there is one,
+        otherwise assumed to be halfway between latitudes
+        (and the poles at either end).
+    """
+    bounds_name = ds["lat"].attrs.get("bounds", "lat_bnds")
+    if bounds_name in ds.variables:
+        bounds = ds[bounds_name]
+        if "time" in bounds.dims:
+            bounds = bounds.isel(time=0)
+
+        return np.sort(bounds.values, axis=1)
+
+    lat = ds["lat"].values
+    edges = np.concatenate([[-90.0], (lat[1:] + lat[:-1]) / 2, [90.0]])
+
+    return np.stack([edges[:-1], edges[1:]], axis=1)
+
+
+def get_region_weights(
+    lat_bounds: np.ndarray, regions: dict[str, tuple[float, float]] = REGIONS
+) -> xr.DataArray:
+    """
+    Get the area weight of each latitude in each region
+
+    The weight is the area of the part of the latitude's band
+    which lies in the region, i.e. the integral of cos(lat)
+    over the overlap, so bands which straddle a region's edge
+    are split correctly.
+
+    Parameters
+    ----------
+    lat_bounds
+        Southern and northern bound of each latitude (see `get_lat_bounds`)
+
+    regions
+        Regions, with their southern and northern latitudes
+
+    Returns
+    -------
+        Weights, with `region` and `lat` dimensions
+    """
+    region_bounds = np.array(list(regions.values()))
+    south = np.maximum(lat_bounds[np.newaxis, :, 0], region_bounds[:, [0]])
+    north = np.minimum(lat_bounds[np.newaxis, :, 1], region_bounds[:, [1]])
+
+    weights = np.where(
+        north > south, np.sin(np.deg2rad(north)) - np.sin(np.deg2rad(south)), 0.0
+    )
+
+    return xr.DataArray(
+        weights, dims=("region", "lat"), coords={"region": list(regions)}
+    )
+
+
+def aggregate_to_regions(da: xr.DataArray, weights: xr.DataArray) -> xr.DataArray:
+    """
+    Aggregate latitudinally resolved data to regions
+
+    This stays lazy if `da` is lazy.
+
+    Parameters
+    ----------
+    da
+        Data to aggregate, with a `lat` dimension
+
+    weights
+        Weight of each latitude in each region (see `get_region_weights`)
+
+    Returns
+    -------
+        Area-weighted mean of `da` in each region.
+        NaN where a region has no data.
+    """
+    weights = weights.drop_vars("lat", errors="ignore")
+    da = da.drop_vars("lat")
+
+    valid = da.notnull()
+    total = xr.dot(da.fillna(0.0), weights, dim="lat")
+    total_weight = xr.dot(valid.astype(weights.dtype), weights, dim="lat")
+
+    out = total / total_weight.where(total_weight > 0)
+    out.attrs = da.attrs
+
+    return out
+
+
+def load_regional(
+    source_id: str,
+    fps: list[Path],
+    regions: dict[str, tuple[float, float]] = REGIONS,
+    time_chunk_size: int = TIME_CHUNK_SIZE,
+) -> xr.Dataset:
+    """
+    Load data and aggregate it onto regions
+
+    Parameters
+    ----------
+    source_id
+        Source ID of the data
+
+    fps
+        Files to load
+
+    regions
+        Regions onto which to aggregate.
+        For CMIP6's hemispheric files, only the regions in `CMIP6_SECTOR_REGIONS`
+        are available, the other regions are left empty.
+
+    time_chunk_size
+        Number of timesteps to load at once
+
+    Returns
+    -------
+        Data with `time` and `region` dimensions
+        and integer `year` and `month` co-ordinates along `time`.
+        Bounds variables are dropped.
+    """
+    ds = xr.open_mfdataset(
+        fps,
+        decode_times=False,
+        data_vars="minimal",
+        chunks={"time": time_chunk_size},
+    )
+
+    if "UoM" in source_id:
+        ds = fix_cmip6_time_axis(ds)
+        variable_map = CMIP6_TO_CMIP7_VARIABLE_MAP
+    else:
+        variable_map = CMIP7_TO_NORMAL_VARIABLE_MAP
+
+    ds = assign_year_month_coords(ds)
+    ds = ds.rename({k: v for k, v in variable_map.items() if k in ds.data_vars})
+
+    lat_bounds = get_lat_bounds(ds) if "lat" in ds.dims else None
+    ds = ds.drop_vars([v for v in ds.data_vars if "bnds" in v or "bounds" in v])
+
+    if "sector" in ds.dims:
+        ds = (
+            ds.sel(sector=list(CMIP6_SECTOR_REGIONS))
+            .rename({"sector": "region"})
+            .assign_coords(region=list(CMIP6_SECTOR_REGIONS.values()))
+            .reindex(region=list(regions))
+        )
+
+    elif lat_bounds is not None:
+        weights = get_region_weights(lat_bounds, regions)
+        ds = xr.Dataset(
+            {
+                name: aggregate_to_regions(da, weights)
+                for name, da in ds.data_vars.items()
+            },
+            attrs=ds.attrs,
+        )
+
+    else:
+        # Already global-mean
+        ds = ds.expand_dims(region=["global"]).reindex(region=list(regions))
+
+    # The data is now small, so we can read it into memory.
+    # Reading happens chunk by chunk, so memory use stays bounded.
+    return ds.transpose("time", "region").compute()
+
+
+def load_regional_annual_mean(source_id: str, fps: list[Path]) -> xr.Dataset:
+    """
+    Load data, aggregate it onto regions and normalise it to annual-means
+
+    Can be used as the loader of a `cache.AnnualMeanCache`.
+
+    Parameters
+    ----------
+    source_id
+        Source ID of the data
+
+    fps
+        Files to load
+
+    Returns
+    -------
+        Annual-mean data with `year` and `region` dimensions
+        and a scalar `source_id` co-ordinate
+    """
+    out = annual_mean(load_regional(source_id, fps))
+
+    return out.assign_coords(source_id=source_id)
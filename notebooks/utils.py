@@ -2,4 +2,6 @@ from pathlib import Path
 
 DATA_DIR = Path(__file__).parents[1] / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
-PROCESSED_DATA_DIR = DATA_DIR / "processed"
\ No newline at end of file
+INTERIM_DATA_DIR = DATA_DIR / "interim"
+PROCESSED_DATA_DIR = DATA_DIR / "processed"
+FIGURES_DIR = Path(__file__).parents[1] / "figures"
@@ -0,0 +1,140 @@
+"""
+Reading of block-structured Excel workbooks
+
+Some workbooks (e.g. Velders et al., 2022's scenarios)
+stack many tables (e.g. one per species) on a single sheet,
+each starting with a header row.
+Rather than relying on fixed offsets,
+we find the header rows and split the sheet into blocks there.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from build_manifest import hash_file
+
+
+def get_excel_engine() -> str:
+    """
+    Get the fastest available engine for reading Excel files
+
+    calamine (Rust) is much faster than openpyxl (pure Python),
+    but is an optional dependency.
+    """
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+
+    return "openpyxl"
+
+
+def read_sheet_values(
+    file: Path, sheet_name: str, cache_dir: Path | None = None
+) -> pd.DataFrame:
+    """
+    Read the raw values of a sheet (i.e. without any header handling)
+
+    Parameters
+    ----------
+    file
+        Workbook to read
+
+    sheet_name
+        Sheet to read
+
+    cache_dir
+        Directory in which to cache the sheet's values.
+        The cache is keyed by the contents of `file`,
+        so a changed workbook is re-read.
+        If not supplied, the sheet is always read from the workbook.
+
+    Returns
+    -------
+        Values of the sheet
+    """
+    if cache_dir is None:
+        return pd.read_excel(
+            file, sheet_name=sheet_name, header=None, engine=get_excel_engine()
+        )
+
+    sheet_key = hashlib.sha256(sheet_name.encode()).hexdigest()[:16]
+    cache_file = Path(cache_dir) / f"{hash_file(file)}-{sheet_key}.pkl"
+    if cache_file.exists():
+        return pd.read_pickle(cache_file)
+
+    out = read_sheet_values(file, sheet_name)
+
+    cache_file.parent.mkdir(exist_ok=True, parents=True)
+    # Write then move so we never leave a half-written file behind
+    tmp_file = cache_file.with_suffix(".pkl.tmp")
+    out.to_pickle(tmp_file)
+    tmp_file.replace(cache_file)
+
+    return out
+
+
+def find_block_starts(values: np.ndarray, header_marker: str) -> np.ndarray:
+    """
+    Find the rows at which blocks start
+
+    Parameters
+    ----------
+    values
+        Values of the sheet (2D)
+
+    header_marker
+        Value which only appears in header rows (e.g. "Species")
+
+    Returns
+    -------
+        Index of each header row
+    """
+    return np.flatnonzero((values == header_marker).any(axis=1))
+
+
+def split_blocks(
+    sheet: pd.DataFrame, header_marker: str, value_columns: Iterable[str]
+) -> list[pd.DataFrame]:
+    """
+    Split a sheet into its blocks
+
+    Parameters
+    ----------
+    sheet
+        Raw values of the sheet (see `read_sheet_values`)
+
+    header_marker
+        Value which only appears in header rows (e.g. "Species").
+        Each block runs from a header row
+        up to its last row with data in all of `value_columns`
+        (so notes between blocks or at the end of the sheet are left out).
+
+    value_columns
+        Columns which hold data in every row of a block (e.g. "Year")
+
+    Returns
+    -------
+        Blocks, with their header row as column names.
+        Columns and rows which are empty within a block are dropped.
+    """
+    value_columns = list(value_columns)
+    starts = find_block_starts(sheet.to_numpy(), header_marker)
+    ends = [*starts[1:], sheet.shape[0]]
+
+    blocks = []
+    for start, end in zip(starts, ends):
+        block = sheet.iloc[start:end].dropna(how="all", axis="columns")
+        block.columns = block.iloc[0, :]
+        block = block.iloc[1:, :]
+
+        with_values = np.flatnonzero(block[value_columns].notna().all(axis="columns"))
+        n_rows = with_values[-1] + 1 if with_values.size > 0 else 0
+        blocks.append(block.iloc[:n_rows].dropna(how="all", axis="rows"))
+
+    return blocks